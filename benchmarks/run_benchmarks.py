@@ -0,0 +1,156 @@
+"""Time and memory-profile the dashboard's data functions at several sizes.
+
+Generates seeded synthetic loan books (utils/synthetic_data.py), runs each
+benchmarked function against them and writes one JSON results file, so
+runs from different commits can be diffed for regressions and scaling
+cliffs.
+
+    python -m benchmarks.run_benchmarks --sizes 100000 1000000
+    python -m benchmarks.run_benchmarks --sizes 1000000 10000000 50000000 \\
+        --output bench_results.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from utils.data_generator import load_loan_data, get_vintage_data
+from utils.risk_analyzer import get_risk_summary, calculate_risk_metrics
+from utils.risk_cube import build_risk_cube
+from utils.search_index import SearchIndex
+from utils.streaming_ingest import stream_loan_aggregates
+from utils.synthetic_data import write_loan_book
+from utils.velocity import analyze_repayment_velocity
+
+DEFAULT_SIZES = [100_000, 1_000_000]
+SEARCH_QUERIES = ['SMB_4793', 'platform:Boulevard risk:non-payment', 'q1 2025']
+
+
+def measure(func, repeats=1):
+    """Best wall time over repeats and peak traced allocation of one call"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds': min(timings), 'peak_bytes': peak}
+
+
+def benchmark_size(n_loans, workdir, seed, repeats):
+    """Run every benchmark against one generated loan book"""
+    csv_path = os.path.join(workdir, f"loans_{n_loans}.csv")
+    start = time.perf_counter()
+    write_loan_book(csv_path, n_loans, seed=seed)
+    print(f"Generated {n_loans:,} loans in {time.perf_counter() - start:.1f}s")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = load_loan_data(csv_path)  # also writes the snapshot
+    search_index = SearchIndex(df)
+
+    cases = {
+        'load_loan_data[csv]':
+        lambda: load_loan_data(csv_path, use_snapshot=False),
+        'load_loan_data[snapshot]': lambda: load_loan_data(csv_path),
+        'stream_loan_aggregates': lambda: stream_loan_aggregates(csv_path),
+        'get_vintage_data': lambda: get_vintage_data(df),
+        'get_risk_summary': lambda: get_risk_summary(df),
+        'calculate_risk_metrics': lambda: calculate_risk_metrics(df),
+        'analyze_repayment_velocity':
+        lambda: analyze_repayment_velocity(df),
+        'build_risk_cube': lambda: build_risk_cube(df),
+        'SearchIndex.build': lambda: SearchIndex(df),
+    }
+    for query in SEARCH_QUERIES:
+        cases[f"SearchIndex.search[{query}]"] = (
+            lambda query=query: search_index.search(query))
+
+    results = []
+    for name, func in cases.items():
+        # Loading is slow enough that a single timed run is representative
+        runs = 1 if name.startswith(('load_', 'stream_')) else repeats
+        result = measure(func, runs)
+        result.update({'benchmark': name, 'n_loans': n_loans})
+        results.append(result)
+        print(f"  {name:<56} {result['seconds'] * 1000:>10.1f} ms "
+              f"{result['peak_bytes'] / 1e6:>10.1f} MB")
+
+    for path in os.listdir(workdir):
+        os.remove(os.path.join(workdir, path))
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'],
+                                capture_output=True,
+                                text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes',
+                        type=int,
+                        nargs='+',
+                        default=DEFAULT_SIZES,
+                        help='loan book sizes to benchmark')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats',
+                        type=int,
+                        default=3,
+                        help='timed runs per in-memory benchmark (best kept)')
+    parser.add_argument('--output',
+                        default='bench_results.json',
+                        help='where to write the JSON results')
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_loans in args.sizes:
+            results.extend(
+                benchmark_size(n_loans, workdir, args.seed, args.repeats))
+
+    report = {
+        'environment': environment(),
+        'seed': args.seed,
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Report import times and first-page latency of the dashboard.
+
+Every measurement runs in a fresh interpreter. Import times are the
+wall time of importing each module alone; first-page latency runs
+main.py once under Streamlit's AppTest against a scratch copy of the
+loan book, first cold (no snapshot) and then after
+jobs/prebuild_snapshot.py has written the snapshot. Each probe is a new
+process, so neither scenario has Streamlit's in-memory caches filled; the
+difference is the snapshot read versus the CSV parse. Run it on two
+commits and compare the JSON files for before/after numbers.
+
+    python -m benchmarks.startup_report
+    python -m benchmarks.startup_report --output startup_before.json
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.run_benchmarks import environment
+from utils.data_generator import DATA_FILE
+
+IMPORT_MODULES = [
+    'pandas', 'pyarrow', 'streamlit', 'plotly.express', 'utils.dataset',
+    'components.portfolio_overview', 'components.vintage_analysis',
+    'components.data_display'
+]
+
+IMPORT_PROBE = """
+import sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+FIRST_PAGE_PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+app = AppTest.from_file({main!r}, default_timeout=300)
+app.run()
+done = time.perf_counter()
+print(json.dumps({{
+    'import_seconds': imported - start,
+    'first_run_seconds': done - imported,
+    'total_seconds': done - start,
+    'plotly_imported': 'plotly' in sys.modules,
+    'exception': bool(app.exception),
+}}))
+"""
+
+
+def run_probe(code, env=None):
+    result = subprocess.run([sys.executable, '-c', code],
+                            capture_output=True,
+                            text=True,
+                            cwd=ROOT,
+                            env=env,
+                            check=True)
+    return result.stdout.strip().splitlines()[-1]
+
+
+def import_times(repeats):
+    """Best fresh-interpreter import time of each module, in seconds"""
+    times = {}
+    for module in IMPORT_MODULES:
+        code = IMPORT_PROBE.format(root=ROOT, module=module)
+        times[module] = min(
+            float(run_probe(code)) for _ in range(repeats))
+    return times
+
+
+def first_page(data_file):
+    """First-page latency on a copy of data_file, cold and pre-built"""
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        scratch = os.path.join(workdir, os.path.basename(data_file))
+        shutil.copyfile(data_file, scratch)
+        env = dict(os.environ, DASHBOARD_DATA_FILE=scratch)
+        code = FIRST_PAGE_PROBE.format(root=ROOT,
+                                       main=os.path.join(ROOT, 'main.py'))
+
+        results['cold'] = json.loads(run_probe(code, env))
+        subprocess.run([sys.executable, '-m', 'jobs.prebuild_snapshot'],
+                       capture_output=True,
+                       cwd=ROOT,
+                       env=env,
+                       check=True)
+        results['prebuilt_snapshot'] = json.loads(run_probe(code, env))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data', default=DATA_FILE, help='loan book CSV')
+    parser.add_argument('--repeats',
+                        type=int,
+                        default=3,
+                        help='fresh interpreters per import (best kept)')
+    parser.add_argument('--output',
+                        default='startup_report.json',
+                        help='where to write the JSON report')
+    args = parser.parse_args(argv)
+
+    report = {
+        'environment': environment(),
+        'imports': import_times(args.repeats),
+        'first_page': first_page(os.path.join(ROOT, args.data)),
+    }
+
+    print("Import time (fresh interpreter)")
+    for module, seconds in report['imports'].items():
+        print(f"  {module:<36} {seconds * 1000:>8.0f} ms")
+    print("First page (AppTest run of main.py)")
+    for scenario, result in report['first_page'].items():
+        print(f"  {scenario:<18} total {result['total_seconds']:.2f}s, "
+              f"script {result['first_run_seconds']:.2f}s, "
+              f"plotly imported: {result['plotly_imported']}")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
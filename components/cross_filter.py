@@ -0,0 +1,62 @@
+import streamlit as st
+
+from utils.risk_analyzer import RISK_FLAG_CATEGORIES
+
+# Bitmap dimensions offered as cross-filters, besides the platform selector
+FILTER_LABELS = {
+    'vintage': "Vintage",
+    'loan_size_category': "Loan size",
+    'risk_category': "Risk category",
+}
+
+
+def render_cross_filters(index, platform_name="All"):
+    """Vintage, loan size, risk, flag and funded-date filters for the overview
+
+    Every combination is resolved on the dataset's BitmapIndex together
+    with the selected platform. Risk flags are matched together: choosing
+    liquidity and revenue drop keeps loans carrying both. Returns None
+    while nothing narrows the platform's loans, otherwise a dict with a
+    'key' identifying the filters plus the 'totals', 'size_counts' and
+    'risk_counts' of BitmapIndex.summary.
+    """
+    filters = {}
+    flags = []
+    date_range = None
+    with st.expander("Cross-filters"):
+        columns = st.columns(len(FILTER_LABELS) + 2)
+        for column, (dimension, label) in zip(columns, FILTER_LABELS.items()):
+            with column:
+                filters[dimension] = st.multiselect(
+                    label,
+                    options=index.values(dimension),
+                    key=f"cross_filter_{dimension}")
+        if index.flag_bitmaps:
+            with columns[-2]:
+                flags = st.multiselect(
+                    "Risk flags (all of)",
+                    options=list(index.flag_bitmaps),
+                    format_func=RISK_FLAG_CATEGORIES.get,
+                    key="cross_filter_flags")
+        if index.first_date is not None:
+            first, last = index.first_date.date(), index.last_date.date()
+            with columns[-1]:
+                chosen = st.date_input("Funded between",
+                                       value=(first, last),
+                                       min_value=first,
+                                       max_value=last,
+                                       key="cross_filter_dates")
+            # A single date is shown while the range is being picked
+            if len(chosen) == 2 and tuple(chosen) != (first, last):
+                date_range = tuple(chosen)
+
+    if not any(filters.values()) and not flags and date_range is None:
+        return None
+
+    if platform_name != 'All':
+        filters['platform'] = [platform_name]
+    bits = index.match(filters, date_range, flags)
+    key = (platform_name, tuple(
+        (dimension, tuple(values)) for dimension, values in filters.items()),
+           tuple(flags), date_range)
+    return {'key': key, **index.summary(bits)}
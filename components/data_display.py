@@ -1,27 +1,86 @@
 import streamlit as st
 import pandas as pd
-
-
-def render_data_display(df):
+import numpy as np
+from utils.export import (EXPORT_FORMATS, EXPORT_CHUNK_ROWS, cached_export,
+                          build_export)
+from utils.figure_cache import cached_sort_order
+from utils.instrumentation import profiled
+from components.diagnostics import profiled_fragment
+
+NO_SORT = "(source order)"
+PAGE_SIZES = [25, 50, 100, 250, 500]
+DEFAULT_PAGE_SIZE = 100
+
+
+def sort_order(df, sort_column, descending):
+    """Row positions of df under the requested sort"""
+    values = df[sort_column]
+    # Sort on integer codes for categoricals so vintages stay chronological
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.cat.codes
+    order = values.argsort(kind='stable').to_numpy()
+    if descending:
+        order = order[::-1]
+    return order
+
+
+def sorted_page_positions(order, rows, size, start, stop):
+    """Positions of one page of rows under a full sort order
+
+    order sorts all size rows of the platform's frame and is cached per
+    sort key; rows are the positions the search kept, or None. Keeping
+    the matching entries of order is a linear pass, not a re-sort.
+    """
+    if rows is not None:
+        keep = np.zeros(size, dtype=bool)
+        keep[rows] = True
+        order = order[keep[order]]
+    return order[start:stop]
+
+
+def format_page(page_data):
+    """Format the visible page only: funded dates as dates
+
+    Money columns stay numeric; column_config formats them, so they also
+    sort numerically in the grid.
+    """
+    page_data = page_data.copy()
+    if 'funded_date' in page_data.columns:
+        page_data['funded_date'] = pd.to_datetime(
+            page_data['funded_date']).dt.date
+    return page_data
+
+
+# A fragment: search, sort and paging widgets rerun only this section
+@profiled_fragment
+@profiled()
+def render_data_display(df, search_index, platform_name="All",
+                        data_version=None):
+    """Searchable, sortable, paged grid of the platform's loans
+
+    df may also be a LoanQuery (utils/sql_backend.py) with no
+    search_index; search, sort and paging then run in SQL and only the
+    visible page is loaded.
+    """
     st.header("Raw Data")
+    in_memory = isinstance(df, pd.DataFrame)
 
     # Add search functionality
     search_term = st.text_input(
-        "Search data", placeholder="Enter business name or filter term")
-
-    # Filter data based on search term if provided
-    if search_term:
-        filtered_data = df[df.astype(str).apply(
-            lambda row: row.str.contains(search_term, case=False).any(),
-            axis=1)]
+        "Search data",
+        placeholder="Business name, platform, vintage or risk "
+        "(e.g. platform:Boulevard risk:non-payment)")
+
+    # Filter data through the prebuilt index if a search term is provided
+    if search_term and not in_memory:
+        filtered_data = df.search(search_term)
+    elif search_term:
+        filtered_data = search_index.filter(df, search_term)
     else:
         filtered_data = df
 
-    # Display number of records and max loan amount
-    st.write(f"Displaying {len(filtered_data)} records")
-
     # Allow column selection
-    all_columns = df.columns.tolist()
+    all_columns = list(df.columns)
 
     # Check if the column exists before setting as default
     default_columns = []
@@ -41,93 +100,108 @@ def render_data_display(df):
                                       default=default_columns)
 
     # If no columns selected, use default columns
-    if not selected_columns and default_columns:
-        selected_columns = default_columns
-
-    # Keep a sortable copy of the data
-    sortable_data = filtered_data.copy()
-
-    # Format currency columns for display purposes
-    display_data = filtered_data.copy()
-
-    # Format Date Funded column if it exists
-    if 'funded_date' in display_data.columns:
-        display_data['funded_date'] = pd.to_datetime(
-            display_data['funded_date']).dt.date
-
-    # Add dollar sign and format Amount column if it exists
-    if 'amount' in display_data.columns:
-        display_data['amount'] = display_data['amount'].apply(
-            lambda x: f"${x:,.0f}")
-
-    # Add dollar sign and remove decimals from Repaid Amount column if it exists
-    if 'repaid_amount' in display_data.columns:
-        display_data['repaid_amount'] = display_data['repaid_amount'].apply(
-            lambda x: f"${x:,.0f}")
-
-    # Add dollar sign and remove decimals from fees column if it exists
-    if 'fees' in display_data.columns:
-        display_data['fees'] = display_data['fees'].apply(
-            lambda x: f"${x:,.0f}")
-
-    # Display the filtered data with selected columns, hiding the index
-    # Use the original numeric data for sorting while showing the formatted display data
-    if selected_columns:
-        st.dataframe(
-            data=display_data[selected_columns],
-            use_container_width=True,
-            hide_index=True,
-            # Provide the original numeric data for proper sorting
-            column_config={
-                "amount":
-                st.column_config.NumberColumn(
-                    format="$%d",
-                    help="Loan amount",
-                    step=1000,
-                ),
-                "repaid_amount":
-                st.column_config.NumberColumn(
-                    format="$%d",
-                    help="Amount repaid so far",
-                    step=1000,
-                ),
-                "fees":
-                st.column_config.NumberColumn(
-                    format="$%d",
-                    help="Fees collected",
-                    step=100,
-                )
-            })
+    if not selected_columns:
+        selected_columns = default_columns or all_columns
+
+    # Server-side sort and paging: only the visible page is sliced,
+    # formatted and sent to the browser
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+    with col1:
+        sort_column = st.selectbox("Sort by", options=[NO_SORT] + all_columns)
+    with col2:
+        descending = st.toggle("Descending", value=False)
+    with col3:
+        page_size = st.selectbox("Rows per page",
+                                 options=PAGE_SIZES,
+                                 index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE))
+
+    total_rows = len(filtered_data)
+    page_count = max(1, -(-total_rows // page_size))
+    with col4:
+        page = st.number_input("Page",
+                               min_value=1,
+                               max_value=page_count,
+                               value=1,
+                               step=1)
+    page = min(page, page_count)
+
+    start = (page - 1) * page_size
+    stop = min(start + page_size, total_rows)
+    if not in_memory:
+        page_data = filtered_data.page(selected_columns, sort_column,
+                                       descending, start, stop)
+    elif sort_column == NO_SORT or sort_column not in df.columns:
+        page_data = filtered_data[selected_columns].iloc[start:stop]
     else:
-        st.dataframe(
-            data=display_data,
-            use_container_width=True,
-            hide_index=True,
-            # Provide the original numeric data for proper sorting
-            column_config={
-                "amount":
-                st.column_config.NumberColumn(
-                    format="$%d",
-                    help="Loan amount",
-                    step=1000,
-                ),
-                "repaid_amount":
-                st.column_config.NumberColumn(
-                    format="$%d",
-                    help="Amount repaid so far",
-                    step=1000,
-                ),
-                "fees":
-                st.column_config.NumberColumn(
-                    format="$%d",
-                    help="Fees collected",
-                    step=100,
-                )
-            })
-
-    # Add download functionality
-    csv = filtered_data.to_csv(index=False)
-    st.download_button(label="Download Filtered Data",
-                       data=csv,
-                       file_name="filtered_loan_data.csv",
-                       mime="text/csv")
+        # The platform's order is sorted once per data version and key;
+        # a search only filters it
+        order = cached_sort_order(
+            sort_column, descending, platform_name, data_version,
+            lambda: sort_order(df, sort_column, descending))
+        rows = (None if filtered_data is df else
+                df.index.get_indexer(filtered_data.index))
+        page_rows = sorted_page_positions(order, rows, len(df), start, stop)
+        page_data = df[selected_columns].iloc[page_rows]
+
+    # Display number of records
+    st.write(f"Displaying {start + 1 if total_rows else 0}-{stop} of "
+             f"{total_rows} records (page {page} of {page_count})")
+
+    # Display the current page with selected columns, hiding the index
+    st.dataframe(
+        data=format_page(page_data),
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "amount":
+            st.column_config.NumberColumn(
+                format="$%d",
+                help="Loan amount",
+                step=1000,
+            ),
+            "repaid_amount":
+            st.column_config.NumberColumn(
+                format="$%d",
+                help="Amount repaid so far",
+                step=1000,
+            ),
+            "fees":
+            st.column_config.NumberColumn(
+                format="$%d",
+                help="Fees collected",
+                step=100,
+            )
+        })
+
+    # Export is built only on request, streamed to disk in chunks and
+    # reused for the same data version, platform, search and columns.
+    # st.download_button reads the whole file into Streamlit's in-memory
+    # media store, so it is shown only in the run answering a request:
+    # a session then holds at most one export's bytes, which Streamlit
+    # drops within two reruns, instead of re-reading the file every rerun.
+    st.markdown("---")
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        export_format = st.selectbox("Export format",
+                                     options=list(EXPORT_FORMATS))
+    export_key = (data_version, platform_name, search_term,
+                  tuple(selected_columns), export_format)
+    with col2:
+        if st.button("Prepare Download"):
+            export_path = cached_export(export_key)
+            if export_path is None:
+                with st.spinner(f"Exporting {total_rows} records..."):
+                    if in_memory:
+                        rows = filtered_data[selected_columns]
+                    else:
+                        # Stream the query result instead of loading it
+                        rows = (chunk[selected_columns] for chunk in
+                                filtered_data.chunks(EXPORT_CHUNK_ROWS))
+                    export_path = build_export(rows, export_format,
+                                               export_key)
+            extension, mime = EXPORT_FORMATS[export_format]
+            with open(export_path, 'rb') as export_file:
+                st.download_button(label="Download Filtered Data",
+                                   data=export_file,
+                                   file_name=f"filtered_loan_data.{extension}",
+                                   mime=mime)
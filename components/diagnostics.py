@@ -0,0 +1,96 @@
+import functools
+
+import streamlit as st
+import pandas as pd
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from utils.figure_cache import cache_stats
+from utils.instrumentation import (history, to_jsonl, to_prometheus,
+                                   start_run, end_run)
+
+# Session state key main.py sets when this session profiles its reruns
+DIAGNOSTICS_KEY = 'diagnostics_enabled'
+
+
+def _fragment_only_rerun():
+    ctx = get_script_run_ctx()
+    return bool(getattr(ctx, 'fragment_ids_this_run', None))
+
+
+def profiled_fragment(func):
+    """st.fragment whose own reruns are profiled as separate runs
+
+    A fragment rerun (search keystrokes, paging, chart options) skips
+    main.py, where profiled runs start and end, so its timings would be
+    dropped. With diagnostics on, each such rerun is recorded as a
+    "fragment:<name>" run in the history instead; during a full rerun the
+    fragment is profiled as part of it as before.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not (st.session_state.get(DIAGNOSTICS_KEY)
+                and _fragment_only_rerun()):
+            return func(*args, **kwargs)
+        start_run(f"fragment:{func.__name__}")
+        try:
+            return func(*args, **kwargs)
+        finally:
+            end_run()
+
+    return st.fragment(wrapper)
+
+
+def render_diagnostics(run):
+    """Opt-in panel with this rerun's per-component timings and exports"""
+    with st.expander("Diagnostics", expanded=True):
+        st.caption(f"Run {run.run_id}: wall time, rows scanned and peak "
+                   "traced allocation of each instrumented function. Peaks "
+                   "are process-wide and include other active sessions.")
+
+        records = run.to_frame()
+        if not records.empty:
+            # Records are appended as calls finish; show them in call order
+            records = records.sort_values('timestamp', kind='stable')
+        if records.empty:
+            st.write("Nothing instrumented has run yet in this rerun.")
+        else:
+            current = pd.DataFrame({
+                'component':
+                [' ' * depth + name
+                 for name, depth in zip(records['name'], records['depth'])],
+                'time (ms)': (records['seconds'] * 1000).round(2),
+                'rows': records['rows'],
+                'peak (MB)': (records['peak_bytes'] / 1e6).round(2),
+            })
+            st.dataframe(current, use_container_width=True, hide_index=True)
+
+        st.caption("Chart caches: " + ", ".join(
+            f"{name} {stats['entries']} entries, {stats['hits']} hits, "
+            f"{stats['misses']} misses"
+            for name, stats in cache_stats().items()))
+
+        runs = history() + [run]
+        past_records = [r for past_run in runs for r in past_run.records]
+        past = pd.DataFrame(past_records)
+        if not past.empty:
+            st.write(f"**Across the last {len(runs)} profiled reruns**")
+            summary = past.groupby('name')['seconds'].agg(
+                calls='size',
+                mean_ms=lambda s: s.mean() * 1000,
+                p95_ms=lambda s: s.quantile(0.95) * 1000,
+                max_ms=lambda s: s.max() * 1000)
+            st.dataframe(summary.round(2).sort_values('mean_ms',
+                                                      ascending=False),
+                         use_container_width=True)
+
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button("Download JSON lines",
+                                   data=to_jsonl(past_records),
+                                   file_name="dashboard_profile.jsonl",
+                                   mime="application/x-ndjson")
+            with col2:
+                st.download_button("Download Prometheus metrics",
+                                   data=to_prometheus(runs),
+                                   file_name="dashboard_profile.prom",
+                                   mime="text/plain")
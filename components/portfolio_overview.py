@@ -1,70 +1,23 @@
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
 import pandas as pd
-
-
-def render_portfolio_overview(df, platform_name="All"):
-    st.header(f"{platform_name} Overview")
-
-    col1, col2, col3 = st.columns(3)
-
-    with col1:
-        total_deployed = df['amount'].sum()
-        st.metric("Total Capital Deployed", f"${total_deployed:,.0f}")
-
-    with col2:
-        total_returned = df['repaid_amount'].sum()
-        st.metric("Total Capital Returned", f"${total_returned:,.0f}")
-
-    with col3:
-        total_fees = df['fees'].sum()
-        st.metric("Total Fees Collected", f"${total_fees:,.0f}")
-
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        total_outstanding_loans = df['amount'].count()
-        st.metric("Total Outstanding Loans", f"{total_outstanding_loans}")
-
-    with col2:
-        avg_loan_amount = df['amount'].mean()
-        st.metric("Average Loan Amount", f"${avg_loan_amount:,.0f}")
-
-    # Loan distribution by size
-    st.markdown("---")
-    st.subheader("Loan Distribution by Size")
-
-    # Create size categories
-    def categorize_loan_size(amount):
-        if amount >= 10000 and amount < 50000:
-            return "Small ($10K-$50K)"
-        elif amount >= 50000 and amount < 150000:
-            return "Medium ($50K-$150K)"
-        elif amount >= 150000:
-            return "Large (>$150K)"
-        else:
-            return "Other"
-
-    # Apply categorization
-    df['loan_size_category'] = df['amount'].apply(categorize_loan_size)
-
-    # Filter out "Other" category if needed
-    size_df = df[df['loan_size_category'] != "Other"]
-
-    # Count by category
-    size_counts = size_df['loan_size_category'].value_counts().reset_index()
+from utils.data_generator import LOAN_SIZE_LABELS
+from utils.figure_cache import cached_figure
+from utils.instrumentation import profiled
+from utils.risk_cube import (cube_portfolio_totals, cube_size_counts,
+                             cube_risk_counts)
+from components.diagnostics import profiled_fragment
+
+
+def size_figure(size_counts):
+    """Bar chart of loan counts per size bucket (a Series by bucket)"""
+    # Imported on first build so the chart stack stays off the boot path
+    import plotly.express as px
+
+    # Leave out loans below the smallest bucket
+    size_counts = size_counts.reindex(LOAN_SIZE_LABELS, fill_value=0)
+    size_counts = size_counts[size_counts > 0].reset_index()
     size_counts.columns = ['loan_size_category', 'Count']
 
-    # Ensure proper order
-    category_order = [
-        "Small ($10K-$50K)", "Medium ($50K-$150K)", "Large (>$150K)"
-    ]
-    size_counts['loan_size_category'] = pd.Categorical(
-        size_counts['loan_size_category'],
-        categories=category_order,
-        ordered=True)
-    size_counts = size_counts.sort_values('loan_size_category')
-
     # Create the bar chart
     size_fig = px.bar(
         size_counts,
@@ -80,13 +33,13 @@ def render_portfolio_overview(df, platform_name="All"):
     size_fig.update_layout(xaxis_title='Loan Size Category',
                            yaxis_title='Number of Loans',
                            margin=dict(t=30, b=0, l=0, r=0))
-    st.plotly_chart(size_fig, use_container_width=True)
+    return size_fig
 
-    st.markdown("---")
 
-    # Risk distribution as pie chart
-    st.subheader("Risk Distribution")
-    risk_counts = df['risk_category'].value_counts()
+def risk_figure(risk_counts):
+    """Pie chart of loans per risk category (a Series, largest first)"""
+    import plotly.express as px
+
     risk_fig = px.pie(values=risk_counts.values,
                       names=risk_counts.index,
                       title='',
@@ -99,5 +52,68 @@ def render_portfolio_overview(df, platform_name="All"):
                       })
     risk_fig.update_traces(textposition='inside', textinfo='percent+label')
     risk_fig.update_layout(margin=dict(t=30, b=0, l=0, r=0))
+    return risk_fig
+
+
+@profiled_fragment
+@profiled()
+def render_portfolio_overview(cube, platform_name="All", data_version=None,
+                              selection=None):
+    """Render KPIs and distributions from a (platform-sliced) risk cube
+
+    selection, the result of render_cross_filters, replaces the cube's
+    totals and counts with those of the cross-filtered loans. Charts are
+    served from the figure cache for a given view and data_version.
+    """
+    st.header(f"{platform_name} Overview")
+
+    if selection is None:
+        view = platform_name
+        totals = cube_portfolio_totals(cube)
+        size_counts = lambda: cube_size_counts(cube)
+        risk_counts = lambda: cube_risk_counts(cube)
+    else:
+        view = selection['key']
+        totals = selection['totals']
+        size_counts = lambda: selection['size_counts']
+        risk_counts = lambda: selection['risk_counts']
+        st.caption(f"{totals['loan_count']:,} loans match the cross-filters")
+
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        total_deployed = totals['amount']
+        st.metric("Total Capital Deployed", f"${total_deployed:,.0f}")
+
+    with col2:
+        total_returned = totals['repaid_amount']
+        st.metric("Total Capital Returned", f"${total_returned:,.0f}")
+
+    with col3:
+        total_fees = totals['fees']
+        st.metric("Total Fees Collected", f"${total_fees:,.0f}")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        total_outstanding_loans = totals['loan_count']
+        st.metric("Total Outstanding Loans", f"{total_outstanding_loans}")
+
+    with col2:
+        avg_loan_amount = totals['avg_amount']
+        st.metric("Average Loan Amount", f"${avg_loan_amount:,.0f}")
+
+    # Loan distribution by size
+    st.markdown("---")
+    st.subheader("Loan Distribution by Size")
+    size_fig = cached_figure('size_distribution', view, data_version,
+                             lambda: size_figure(size_counts()))
+    st.plotly_chart(size_fig, use_container_width=True)
+
+    st.markdown("---")
+
+    # Risk distribution as pie chart
+    st.subheader("Risk Distribution")
+    risk_fig = cached_figure('risk_distribution', view, data_version,
+                             lambda: risk_figure(risk_counts()))
     st.plotly_chart(risk_fig, use_container_width=True)
     st.markdown("---")
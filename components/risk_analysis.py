@@ -1,9 +1,12 @@
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
+from utils.instrumentation import profiled
 
 
+@profiled()
 def render_risk_analysis(df, risk_summary):
+    # Imported on first render so the chart stack stays off the boot path
+    import plotly.graph_objects as go
+
     st.header("Risk Analysis")
 
     # Risk distribution
@@ -18,7 +21,7 @@ def render_risk_analysis(df, risk_summary):
     # Count risk categories directly from the DataFrame
     if not df.empty:
         # Create a summary DataFrame that works with any number of platforms
-        risk_counts = df.groupby('risk_category').size().reset_index(
+        risk_counts = df.groupby('risk_category', observed=True).size().reset_index(
             name='count')
         risk_counts['percentage'] = risk_counts['count'] / len(df) * 100
 
@@ -0,0 +1,63 @@
+import streamlit as st
+
+from utils.figure_cache import cached_figure, cached_view
+from utils.instrumentation import profiled
+from utils.rolling_metrics import ROLLING_WINDOWS, rolling_cohort_metrics
+from components.diagnostics import profiled_fragment
+
+
+def rolling_rates_figure(rolling, window):
+    """Repayment, non-payment and at-risk rates over one trailing window"""
+    import plotly.express as px
+
+    fig = px.line(rolling[rolling['window'] == window],
+                  x='day',
+                  y=['repayment_rate', 'non_payment_rate', 'at_risk_rate'],
+                  title=f'Trailing {window}-Day Cohort Rates',
+                  color_discrete_sequence=['#4682B4', '#FF4B4B', '#FFA500'])
+    fig.update_layout(xaxis_title='Funded Through',
+                      yaxis_title='Rate (%)',
+                      margin=dict(t=30, b=0, l=0, r=0),
+                      legend_title_text='Metric')
+    return fig
+
+
+@profiled_fragment
+@profiled()
+def render_rolling_metrics(platform_index, platform_name="All",
+                           data_version=None):
+    """Loans funded in the last 30/60/90 days and their rolling rates
+
+    Windows end on the latest funded date in the data. The rolling table
+    and charts are cached per platform and data_version.
+    """
+    st.subheader("Rolling Cohort Metrics")
+    rolling = cached_view(
+        'rolling_metrics', platform_name, data_version,
+        lambda: rolling_cohort_metrics(platform_index.blocks(platform_name)))
+    if rolling.empty:
+        st.write("No funded dates to analyze.")
+        return
+
+    as_of = rolling['day'].max()
+    latest = rolling[rolling['day'] == as_of].set_index('window')
+    st.caption(f"Trailing windows ending on the latest funded date, "
+               f"{as_of:%Y-%m-%d}")
+
+    columns = st.columns(len(ROLLING_WINDOWS))
+    for column, window in zip(columns, ROLLING_WINDOWS):
+        row = latest.loc[window]
+        with column:
+            st.metric(f"Funded in Last {window} Days", f"{row['loans']:,}")
+            st.write(f"Repayment rate {row['repayment_rate']:.1f}% · "
+                     f"Non-payment {row['non_payment_rate']:.1f}%")
+
+    window = st.radio("Window",
+                      options=list(ROLLING_WINDOWS),
+                      format_func=lambda days: f"{days} days",
+                      horizontal=True,
+                      key="rolling_window")
+    fig = cached_figure(f'rolling_rates_{window}', platform_name,
+                        data_version,
+                        lambda: rolling_rates_figure(rolling, window))
+    st.plotly_chart(fig, use_container_width=True)
@@ -1,86 +1,92 @@
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
+from utils.risk_cube import cube_vintage_risk
+from utils.velocity import analyze_repayment_velocity
+from utils.figure_cache import cached_figure, cached_view
+from utils.instrumentation import profiled
+from components.diagnostics import profiled_fragment
 
 
-def analyze_repayment_velocity(df):
-    """Analyze the repayment velocity across different vintages"""
-    if df.empty or 'repaid_amount' not in df.columns or 'amount' not in df.columns:
-        return pd.DataFrame()
-    
-    # Calculate repayment percentage for each loan
-    df_copy = df.copy()
-    df_copy['repayment_pct'] = df_copy['repaid_amount'] / df_copy['amount'] * 100
-    
-    # Group by vintage and calculate velocity metrics
-    velocity_data = df_copy.groupby('vintage').agg({
-        'repayment_pct': ['mean', 'median', 'std', 'count'],
-        'amount': 'sum',
-        'repaid_amount': 'sum'
-    })
-    
-    # Flatten the multi-index columns
-    velocity_data.columns = ['avg_repayment_pct', 'median_repayment_pct', 
-                             'std_repayment_pct', 'loan_count', 
-                             'total_amount', 'total_repaid']
-    
-    # Calculate overall repayment rate
-    velocity_data['overall_repayment_rate'] = velocity_data['total_repaid'] / velocity_data['total_amount'] * 100
-    
-    # Reset index to make vintage a column
-    velocity_data = velocity_data.reset_index()
-    
-    # Sort by vintage chronologically
-    def vintage_sort_key(vintage_str):
-        # Parse 'Q1 2024' format into a sortable value
-        try:
-            quarter = int(vintage_str[1])
-            year = int(vintage_str.split()[1])
-            return year * 10 + quarter
-        except:
-            return 0  # Default for any unparseable vintages
-            
-    velocity_data['sort_key'] = velocity_data['vintage'].apply(vintage_sort_key)
-    velocity_data = velocity_data.sort_values('sort_key')
-    velocity_data = velocity_data.drop('sort_key', axis=1)
-    
-    return velocity_data
+def vintage_risk_table(cube):
+    """Risk category counts per vintage with totals and Non-Payment Risk %"""
+    # Count risk categories per vintage from the cube
+    vintage_risk = cube_vintage_risk(cube).reset_index()
+
+    # Ensure 'Non-Payment Risk' column exists
+    if 'Non-Payment Risk' not in vintage_risk.columns:
+        vintage_risk['Non-Payment Risk'] = 0
+
+    # Calculate total loans per vintage for percentage
+    vintage_risk['Total Loans'] = vintage_risk.drop('vintage',
+                                                    axis=1).sum(axis=1)
+    vintage_risk['Non-Payment Risk %'] = (vintage_risk['Non-Payment Risk'] /
+                                          vintage_risk['Total Loans'] *
+                                          100).round(1)
+    return vintage_risk
+
+
+def non_payment_figure(vintage_risk):
+    # Imported on first build so the chart stack stays off the boot path
+    import plotly.express as px
+
+    fig = px.line(vintage_risk,
+                  x='vintage',
+                  y='Non-Payment Risk %',
+                  title='Percentage of Non-Payment Risk Loans by Vintage',
+                  markers=True,
+                  color_discrete_sequence=['#FF4B4B'])
+    fig.update_layout(yaxis_title='Non-Payment Risk %',
+                      margin=dict(t=30, b=0, l=0, r=0))
+    return fig
+
+
+def repayment_rate_figure(velocity_data):
+    import plotly.express as px
+
+    # Overall repayment rate by vintage
+    fig = px.line(velocity_data,
+                  x='vintage',
+                  y='overall_repayment_rate',
+                  title='Overall Repayment Rate by Vintage',
+                  markers=True,
+                  color_discrete_sequence=['#4682B4'])
+    fig.update_layout(yaxis_title='Repayment Rate (%)',
+                      margin=dict(t=30, b=0, l=0, r=0))
+    return fig
 
 
-def render_vintage_analysis(df, vintage_data):
+def repayment_pct_figure(velocity_data):
+    import plotly.express as px
+
+    # Loan-level repayment analysis
+    fig = px.bar(velocity_data,
+                 x='vintage',
+                 y=['avg_repayment_pct', 'median_repayment_pct'],
+                 title='Average vs Median Repayment Percentage by Vintage',
+                 barmode='group',
+                 color_discrete_sequence=['#90EE90', '#FFA500'])
+    fig.update_layout(yaxis_title='Repayment Percentage (%)',
+                      margin=dict(t=30, b=0, l=0, r=0),
+                      legend_title_text='Metric')
+    return fig
+
+
+@profiled_fragment
+@profiled()
+def render_vintage_analysis(df, cube, platform_name="All", data_version=None):
+    """Vintage risk and repayment velocity for one platform's loans
+
+    The aggregated tables and charts are cached per platform and
+    data_version, so repeat views skip both.
+    """
     st.subheader("Vintage & Cohort Analysis")
     if not df.empty and 'vintage' in df.columns and 'risk_category' in df.columns:
-        # Group by vintage and count risk categories
-        vintage_risk = df.groupby(
-            ['vintage',
-             'risk_category']).size().unstack(fill_value=0).reset_index()
-
-        # Ensure 'Non-Payment Risk' column exists
-        if 'Non-Payment Risk' not in vintage_risk.columns:
-            vintage_risk['Non-Payment Risk'] = 0
-
-        # Calculate total loans per vintage for percentage
-        vintage_risk['Total Loans'] = vintage_risk.drop('vintage',
-                                                        axis=1).sum(axis=1)
-        vintage_risk['Non-Payment Risk %'] = (
-            vintage_risk['Non-Payment Risk'] / vintage_risk['Total Loans'] *
-            100).round(1)
-
-        # Sort by vintage chronologically 
-        def vintage_sort_key(vintage_str):
-            # Parse 'Q1 2024' format into a sortable value
-            try:
-                quarter = int(vintage_str[1])
-                year = int(vintage_str.split()[1])
-                return year * 10 + quarter
-            except:
-                return 0  # Default for any unparseable vintages
-                
-        vintage_risk['sort_key'] = vintage_risk['vintage'].apply(vintage_sort_key)
-        vintage_risk = vintage_risk.sort_values('sort_key')
-        vintage_risk = vintage_risk.drop('sort_key', axis=1)
+        vintage_risk = cached_view('vintage_risk', platform_name,
+                                   data_version,
+                                   lambda: vintage_risk_table(cube))
+
+        # Rows are already chronological: vintage is an ordered categorical
 
         # Identify highest risk vintages
         high_risk_vintages = vintage_risk.sort_values('Non-Payment Risk %',
@@ -92,17 +98,9 @@ def render_vintage_analysis(df, vintage_data):
             )
 
         # Create risk analysis charts
-
-        fig2 = px.line(vintage_risk,
-                       x='vintage',
-                       y='Non-Payment Risk %',
-                       title='Percentage of Non-Payment Risk Loans by Vintage',
-                       markers=True,
-                       color_discrete_sequence=['#FF4B4B'])
-        fig2.update_layout(yaxis_title='Non-Payment Risk %',
-                           margin=dict(t=30, b=0, l=0, r=0))
-
-        # Display charts
+        fig2 = cached_figure('non_payment_by_vintage', platform_name,
+                             data_version,
+                             lambda: non_payment_figure(vintage_risk))
         st.plotly_chart(fig2, use_container_width=True)
 
         # Display data table with all risk categories
@@ -119,22 +117,18 @@ def render_vintage_analysis(df, vintage_data):
         st.markdown("---")
         st.subheader("Repayment Velocity Analysis")
         
-        velocity_data = analyze_repayment_velocity(df)
+        velocity_data = cached_view(
+            'repayment_velocity', platform_name, data_version,
+            lambda: analyze_repayment_velocity(df, cube))
         
         if not velocity_data.empty:
             # Create charts for repayment velocity
             col1, col2 = st.columns(2)
             
             with col1:
-                # Overall repayment rate by vintage
-                fig1 = px.line(velocity_data, 
-                              x='vintage', 
-                              y='overall_repayment_rate',
-                              title='Overall Repayment Rate by Vintage',
-                              markers=True,
-                              color_discrete_sequence=['#4682B4'])
-                fig1.update_layout(yaxis_title='Repayment Rate (%)',
-                                  margin=dict(t=30, b=0, l=0, r=0))
+                fig1 = cached_figure(
+                    'repayment_rate_by_vintage', platform_name, data_version,
+                    lambda: repayment_rate_figure(velocity_data))
                 st.plotly_chart(fig1, use_container_width=True)
                 
                 # Identify trends
@@ -148,16 +142,9 @@ def render_vintage_analysis(df, vintage_data):
                         st.warning(f"⚠️ Latest vintage ({latest_vintages[-1]}) shows decreased repayment rate compared to previous vintage.")
             
             with col2:
-                # Loan-level repayment analysis
-                fig2 = px.bar(velocity_data,
-                             x='vintage',
-                             y=['avg_repayment_pct', 'median_repayment_pct'],
-                             title='Average vs Median Repayment Percentage by Vintage',
-                             barmode='group',
-                             color_discrete_sequence=['#90EE90', '#FFA500'])
-                fig2.update_layout(yaxis_title='Repayment Percentage (%)',
-                                  margin=dict(t=30, b=0, l=0, r=0),
-                                  legend_title_text='Metric')
+                fig2 = cached_figure(
+                    'repayment_pct_by_vintage', platform_name, data_version,
+                    lambda: repayment_pct_figure(velocity_data))
                 st.plotly_chart(fig2, use_container_width=True)
             
             # Detailed velocity metrics table
@@ -165,7 +152,9 @@ def render_vintage_analysis(df, vintage_data):
             
             # Format the table columns for better readability
             display_velocity = velocity_data.copy()
-            for col in ['avg_repayment_pct', 'median_repayment_pct', 'overall_repayment_rate']:
+            pct_cols = ['avg_repayment_pct', 'p10_repayment_pct', 'median_repayment_pct',
+                        'p90_repayment_pct', 'overall_repayment_rate']
+            for col in pct_cols:
                 display_velocity[col] = display_velocity[col].round(1).astype(str) + '%'
             
             display_velocity['total_amount'] = display_velocity['total_amount'].apply(lambda x: f"${x:,.0f}")
@@ -173,9 +162,8 @@ def render_vintage_analysis(df, vintage_data):
             
             # Display table with key metrics
             st.dataframe(display_velocity[[
-                'vintage', 'loan_count', 'total_amount', 'total_repaid',
-                'avg_repayment_pct', 'median_repayment_pct', 'overall_repayment_rate'
-            ]], use_container_width=True)
+                'vintage', 'loan_count', 'total_amount', 'total_repaid'
+            ] + pct_cols], use_container_width=True)
             
             # Key insights
             st.markdown("### Key Insights")
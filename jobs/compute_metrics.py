@@ -0,0 +1,171 @@
+"""Compute every dashboard metric per platform without the UI stack.
+
+Loads the loan book (reusing its columnar snapshot), computes the vintage,
+risk, repayment velocity and portfolio metrics for each platform and for
+the whole book in a process pool sharded by platform, and writes one file
+per platform and metric plus a manifest.json. Nothing from streamlit,
+plotly or components/ is imported, so it suits scheduled jobs.
+
+    python -m jobs.compute_metrics --output-dir metrics
+    python -m jobs.compute_metrics --data attached_assets/pipe_final.csv \\
+        --format json parquet --workers 4
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from utils.data_generator import DATA_FILE, load_loan_data, get_vintage_data
+from utils.platform_index import PlatformIndex
+from utils.risk_analyzer import (get_risk_summary, calculate_risk_metrics,
+                                 risk_flag_combinations)
+from utils.risk_cube import (build_risk_cube, cube_portfolio_totals,
+                             cube_size_counts, cube_risk_counts)
+from utils.snapshot_cache import source_version
+from utils.velocity import analyze_repayment_velocity
+
+OUTPUT_FORMATS = ['json', 'parquet']
+
+# Loan frame of the worker process, loaded once by _init_worker
+_worker_df = None
+
+
+def compute_metrics(df):
+    """Every dashboard metric for one platform's loans, by name"""
+    cube = build_risk_cube(df)
+    return {
+        'vintage_data': get_vintage_data(df),
+        'risk_summary': get_risk_summary(df).reset_index(),
+        'risk_metrics': calculate_risk_metrics(df),
+        'risk_flag_combinations': risk_flag_combinations(df),
+        'repayment_velocity': analyze_repayment_velocity(df),
+        'portfolio_totals': cube_portfolio_totals(cube),
+        'loan_size_counts': cube_size_counts(cube).reset_index(),
+        'risk_category_counts': cube_risk_counts(cube).reset_index(),
+    }
+
+
+def platform_slug(platform):
+    return re.sub(r'[^a-z0-9]+', '_', platform.lower()).strip('_')
+
+
+def _json_value(value):
+    # numpy scalars and NaN are not JSON serializable as-is
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def write_metric(value, path_base, formats):
+    """Write one metric as each requested format; returns the paths"""
+    paths = []
+    if isinstance(value, dict):
+        value_frame = pd.DataFrame([value])
+        if 'json' in formats:
+            with open(f"{path_base}.json", 'w') as f:
+                json.dump({k: _json_value(v) for k, v in value.items()}, f)
+            paths.append(f"{path_base}.json")
+    else:
+        value_frame = value
+        if 'json' in formats:
+            value.to_json(f"{path_base}.json",
+                          orient='records',
+                          date_format='iso')
+            paths.append(f"{path_base}.json")
+    if 'parquet' in formats:
+        value_frame.to_parquet(f"{path_base}.parquet", index=False)
+        paths.append(f"{path_base}.parquet")
+    return paths
+
+
+def _init_worker(data_file):
+    global _worker_df
+    _worker_df = load_loan_data(data_file)
+
+
+def run_shard(platform, output_dir, formats):
+    """Compute and write one platform's metrics in a worker process"""
+    start = time.perf_counter()
+    loans = PlatformIndex(_worker_df).select(platform)
+    shard_dir = os.path.join(output_dir, platform_slug(platform))
+    os.makedirs(shard_dir, exist_ok=True)
+    files = []
+    for name, value in compute_metrics(loans).items():
+        files.extend(
+            write_metric(value, os.path.join(shard_dir, name), formats))
+    return {
+        'platform': platform,
+        'loan_count': len(loans),
+        'seconds': time.perf_counter() - start,
+        'files': [os.path.relpath(path, output_dir) for path in files],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data', default=DATA_FILE, help='loan book CSV')
+    parser.add_argument('--output-dir', default='metrics')
+    parser.add_argument('--format',
+                        nargs='+',
+                        choices=OUTPUT_FORMATS,
+                        default=['json'],
+                        dest='formats')
+    parser.add_argument('--workers',
+                        type=int,
+                        default=None,
+                        help='worker processes (default: one per shard, '
+                        'up to the CPU count; 0 runs in-process)')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    # Loading once up front writes the snapshot that every worker then
+    # memory-maps, and gives the shard list
+    df = load_loan_data(args.data)
+    if df.empty:
+        print(f"No loans loaded from {args.data}", file=sys.stderr)
+        return 1
+    shards = ['All'] + PlatformIndex(df).platforms
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    if args.workers == 0:
+        _init_worker(args.data)
+        results = [
+            run_shard(platform, args.output_dir, args.formats)
+            for platform in shards
+        ]
+    else:
+        workers = args.workers or min(len(shards), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_worker,
+                                 initargs=(args.data, )) as pool:
+            futures = [
+                pool.submit(run_shard, platform, args.output_dir,
+                            args.formats) for platform in shards
+            ]
+            results = [future.result() for future in futures]
+
+    manifest = {
+        'data_file': args.data,
+        'data_version': source_version(args.data),
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'seconds': time.perf_counter() - start,
+        'shards': results,
+    }
+    with open(os.path.join(args.output_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Wrote metrics for {len(results)} shards to {args.output_dir} "
+          f"in {manifest['seconds']:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
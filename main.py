@@ -1,11 +1,18 @@
+import os
 import streamlit as st
 import pandas as pd
-from utils.data_generator import load_loan_data, get_vintage_data
-from utils.risk_analyzer import get_risk_summary, calculate_risk_metrics
+from utils.data_generator import DATA_FILE
+from utils.dataset import DatasetStore, LoanDataset
+from utils.risk_cube import slice_cube
+from utils.sql_backend import LoanDatabase
+from utils.figure_cache import cached_view
 from components.portfolio_overview import render_portfolio_overview
+from components.cross_filter import render_cross_filters
 from components.vintage_analysis import render_vintage_analysis
-from components.risk_analysis import render_risk_analysis
+from components.rolling_metrics import render_rolling_metrics
 from components.data_display import render_data_display
+from components.diagnostics import DIAGNOSTICS_KEY, render_diagnostics
+from utils.instrumentation import start_run, end_run
 
 st.set_page_config(page_title="AI-Powered Risk Insights Dashboard",
                    page_icon="📊",
@@ -22,43 +29,107 @@ hide_streamlit_style = """
 """
 st.markdown(hide_streamlit_style, unsafe_allow_html=True)
 
+# Opt-in rerun profiling: ?diagnostics=1 or DASHBOARD_DIAGNOSTICS=1
+diagnostics_enabled = (os.environ.get('DASHBOARD_DIAGNOSTICS') == '1'
+                       or st.query_params.get('diagnostics') == '1')
+# Fragment reruns skip this script; they read the flag from the session
+st.session_state[DIAGNOSTICS_KEY] = diagnostics_enabled
+profile = start_run('rerun', enabled=diagnostics_enabled)
 
-# Load real data
-@st.cache_data
-def load_data():
-    df = load_loan_data()
-    vintage_data = get_vintage_data(df)
-    risk_summary = get_risk_summary(df)
-    risk_metrics = calculate_risk_metrics(df)
-    return df, vintage_data, risk_summary, risk_metrics
+
+# Loan book CSV; overridable so startup can be measured on a scratch copy
+DATA_PATH = os.environ.get('DASHBOARD_DATA_FILE', DATA_FILE)
+
+# Seconds between background checks of the source file for new data
+REFRESH_INTERVAL = int(os.environ.get('DASHBOARD_REFRESH_SECONDS', '60'))
+
+# Optional directory of delta CSVs (new or updated loans) to upsert
+DELTA_DIR = os.environ.get('DASHBOARD_DELTA_DIR')
+
+# Optional SQLite database file. When set, the loan book is written there
+# once and queried in place instead of being loaded into memory.
+SQL_DB = os.environ.get('DASHBOARD_SQL_DB')
+
+
+# Load real data once per process; every session reads the same
+# read-only LoanDataset instead of a per-session deserialized copy.
+# New versions are built by a background thread and swapped in, so no
+# rerun waits for a reload once the first version is up.
+@st.cache_resource
+def dataset_store():
+    store = DatasetStore(DATA_PATH, delta_dir=DELTA_DIR)
+    store.start_refresher(REFRESH_INTERVAL)
+    return store
+
+
+# The SQL backend is shared the same way; sync() rebuilds the database
+# file only when the source CSV changes
+@st.cache_resource
+def loan_database():
+    return LoanDatabase(SQL_DB, DATA_PATH)
+
+
+def format_age(seconds):
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} min"
+    return f"{seconds / 3600:.1f} h"
 
 
 # Load data with error handling
+store = database = None
+dataset = LoanDataset.empty()
 try:
-    df, vintage_data, risk_summary, risk_metrics = load_data()
+    if SQL_DB:
+        database = loan_database()
+        database.sync()
+    else:
+        store = dataset_store()
+        dataset = store.get()
 except Exception as e:
     st.error(f"Error loading data: {str(e)}")
-    df = pd.DataFrame()
-    vintage_data = pd.DataFrame()
-    risk_summary = pd.DataFrame()
-    risk_metrics = {}
+    store = database = None
+
+if database is not None:
+    data_version = database.version
+    data_age = database.age_seconds
+    platforms = database.platforms
+else:
+    data_version = dataset.version
+    data_age = dataset.age_seconds
+    platforms = dataset.platform_index.platforms
 
 # Main navigation
 st.title("Risk Insights Dashboard")
 
+# Active data version and how long it has been served
+if data_version is not None:
+    status = (f"Data version {data_version} · loaded "
+              f"{format_age(data_age)} ago")
+    if store is not None and store.refreshing:
+        status += " · newer data is loading in the background"
+    elif store is not None and store.last_error:
+        status += f" · last refresh failed: {store.last_error}"
+    st.caption(status)
+
 # Platform selection in session state
 if 'selected_platform' not in st.session_state:
     st.session_state.selected_platform = 'Priority'  # Set default platform
 
-# Create tabs
-overview, portfolio, data_tab = st.tabs(
-    ["Overview", "Portfolio Analysis", "Data"])
+# Section navigation. Unlike st.tabs, which runs every tab's body on each
+# rerun, only the selected section is rendered.
+SECTIONS = ["Overview", "Portfolio Analysis", "Data"]
+active_section = st.radio("Section",
+                          options=SECTIONS,
+                          horizontal=True,
+                          key="active_section",
+                          label_visibility="collapsed")
 
-with overview:
+if active_section == "Overview":
     st.markdown("### Portfolio Selection")
 
     # Platform selection
-    platforms = sorted(df['platform'].unique().tolist())
     # Ensure Priority is first in the list after 'All'
     if 'Priority' in platforms:
         platforms.remove('Priority')
@@ -66,8 +137,10 @@ with overview:
     else:
         platform_options = ['All'] + platforms
 
-    # Find the index of Priority
-    default_index = platform_options.index('Priority')
+    # Keep the current choice when coming back from another section
+    selected = st.session_state.selected_platform
+    default_index = platform_options.index(
+        selected if selected in platform_options else 'Priority')
 
     st.session_state.selected_platform = st.selectbox(
         "Select Platform to run analysis",
@@ -144,22 +217,57 @@ with overview:
 
     st.markdown("---")
 
-# Filter data based on selected platform
-filtered_df = df
-if st.session_state.selected_platform != 'All':
-    filtered_df = df[df['platform'] == st.session_state.selected_platform]
+# Filter data based on selected platform (a view, not a copy)
+if database is not None:
+    # A query handle: the platform filter and every group-by run in SQL
+    filtered_df = database.select(st.session_state.selected_platform)
+    platform_cube = cached_view('risk_cube',
+                                st.session_state.selected_platform,
+                                data_version, filtered_df.risk_cube)
+else:
+    filtered_df = dataset.platform_index.select(
+        st.session_state.selected_platform)
+    platform_cube = slice_cube(dataset.cube,
+                               st.session_state.selected_platform)
 
 # Render portfolio analysis with all components
-with portfolio:
+if active_section == "Portfolio Analysis":
+
+    # Cross-filters resolve on the in-memory bitmap index, so they are
+    # offered only when the loan book is loaded
+    selection = None
+    if database is None:
+        selection = render_cross_filters(dataset.bitmap_index,
+                                         st.session_state.selected_platform)
 
     # Portfolio Overview Section
-    render_portfolio_overview(filtered_df, st.session_state.selected_platform)
+    render_portfolio_overview(platform_cube,
+                              st.session_state.selected_platform,
+                              data_version, selection)
 
     # Vintage Analysis Section
-    render_vintage_analysis(filtered_df, get_vintage_data(filtered_df))
-
-# Data tab content
-with data_tab:
-    render_data_display(filtered_df)
+    render_vintage_analysis(filtered_df, platform_cube,
+                            st.session_state.selected_platform, data_version)
+
+    # Rolling windows are cut from the in-memory, date-sorted blocks
+    if database is None:
+        render_rolling_metrics(dataset.platform_index,
+                               st.session_state.selected_platform,
+                               data_version)
+
+# Data tab content; the search index is built on the first visit
+if active_section == "Data":
+    if database is not None:
+        # Search, sort and paging run in SQL; only the visible page (or a
+        # requested export) is read from the database
+        data_df, search_index = filtered_df, None
+    else:
+        data_df, search_index = filtered_df, dataset.search_index
+    render_data_display(data_df, search_index,
+                        st.session_state.selected_platform, data_version)
 
 # Remove sidebar export since we have it in the Data tab now
+
+if profile is not None:
+    render_diagnostics(profile)
+    end_run()
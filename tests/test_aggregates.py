@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from utils.aggregates import GroupedStats, SKETCH_BIN_WIDTH, SKETCH_GROWTH
+
+QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+
+
+def exact_quantiles(values):
+    return np.quantile(values, QUANTILES)
+
+
+def sketch_quantiles(stats):
+    return np.array([stats.quantile(q).iloc[0] for q in QUANTILES])
+
+
+def test_quantiles_inside_range_within_one_bin():
+    values = np.random.default_rng(0).uniform(0, 120, 50_000)
+    stats = GroupedStats.from_values(np.zeros(len(values)), values)
+    error = np.abs(sketch_quantiles(stats) - exact_quantiles(values))
+    assert error.max() <= SKETCH_BIN_WIDTH
+
+
+def test_quantiles_above_range_within_relative_bound():
+    values = np.random.default_rng(1).lognormal(7, 1.5, 50_000) + 200
+    stats = GroupedStats.from_values(np.zeros(len(values)), values)
+    exact = exact_quantiles(values)
+    relative = np.abs(sketch_quantiles(stats) - exact) / exact
+    assert relative.max() <= SKETCH_GROWTH - 1
+
+
+def test_merge_equals_state_of_concatenated_input():
+    rng = np.random.default_rng(2)
+    values = np.concatenate((rng.uniform(0, 200, 10_000),
+                             rng.uniform(200, 5_000, 1_000)))
+    groups = pd.Series(rng.choice(['a', 'b', 'c'], len(values)))
+    whole = GroupedStats.from_values(groups, values)
+    merged = GroupedStats.from_values(groups[:4_000], values[:4_000]).merge(
+        GroupedStats.from_values(groups[4_000:], values[4_000:]))
+    assert list(merged.keys) == list(whole.keys)
+    np.testing.assert_array_equal(merged.histogram, whole.histogram)
+    for q in QUANTILES:
+        pd.testing.assert_series_equal(merged.quantile(q), whole.quantile(q))
@@ -0,0 +1,48 @@
+import os
+
+import pandas as pd
+import pytest
+
+from utils.snapshot_diff import SnapshotHistory
+
+RAW_LOANS = pd.DataFrame({
+    'Embedded Platform Name': ['Priority', 'Priority', 'Boulevard'],
+    'SMB Name': ['SMB_1', 'SMB_2', 'SMB_3'],
+    'Loan Funded On': ['2024-01-05', '2024-02-10', '2024-04-20'],
+    'Loan Amount': [20000, 60000, 15000],
+    'Pipe Fees': [2000.0, 6000.0, 1500.0],
+    'Repaid Total So Far': [5000.0, 10000.0, 0.0],
+    'Liquidity Risk': [0, 1, 0],
+    'Revenue Drop Risk': [0, 0, 0],
+    'Non-Payment Risk': [0, 0, 1],
+})
+
+
+def write_snapshots(tmp_path, repaid_increase=(0.0, 1000.0)):
+    paths = []
+    for i, increase in enumerate(repaid_increase):
+        loans = RAW_LOANS.copy()
+        loans['Repaid Total So Far'] += increase
+        path = tmp_path / f"loans_{i}.csv"
+        loans.to_csv(path, index=False)
+        paths.append(str(path))
+    return paths
+
+
+def test_identical_mtimes_raise(tmp_path):
+    paths = write_snapshots(tmp_path)
+    for path in paths:
+        os.utime(path, (1_700_000_000, 1_700_000_000))
+    with pytest.raises(ValueError):
+        SnapshotHistory.from_files(paths)
+
+
+def test_explicit_as_of(tmp_path):
+    paths = write_snapshots(tmp_path)
+    for path in paths:
+        os.utime(path, (1_700_000_000, 1_700_000_000))
+    history = SnapshotHistory.from_files(
+        paths, as_of=[pd.Timestamp('2025-01-01'), pd.Timestamp('2025-01-11')])
+    deltas = history.loan_deltas()
+    assert deltas['repaid_delta'].tolist() == [1000.0] * 3
+    assert deltas['velocity'].tolist() == [100.0] * 3
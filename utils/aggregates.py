@@ -0,0 +1,219 @@
+import numpy as np
+import pandas as pd
+
+# Quantile histograms bucket values into fixed-width bins over this range,
+# where repayment percentages normally fall
+SKETCH_RANGE = (0.0, 200.0)
+SKETCH_BIN_WIDTH = 0.01
+
+# Above the range, bins grow geometrically by this factor, up to
+# SKETCH_RANGE[1] * SKETCH_GROWTH ** SKETCH_OVERFLOW_BINS (about 9e10)
+SKETCH_GROWTH = 1.01
+SKETCH_OVERFLOW_BINS = 2000
+
+
+class GroupedStats:
+    """Mergeable per-group summary of a numeric column
+
+    Holds count, sum and sum of squares (exact mean and sample std), the
+    exact min and max, and a fixed-bin histogram for quantiles. States
+    built from chunks, platforms or worker processes merge by addition,
+    so merging is exact: a merged state equals the state of the
+    concatenated input.
+
+    This stands in for a t-digest or KLL sketch: with fixed bins, merges
+    are exact and deterministic. The error bounds come from the bins:
+
+    - inside SKETCH_RANGE an order statistic is estimated within one bin
+      width (SKETCH_BIN_WIDTH, 0.01 percentage points for repayment
+      percentages);
+    - above it, within (SKETCH_GROWTH - 1) of the value, i.e. 1%;
+    - below SKETCH_RANGE[0] and beyond the last overflow bin, values are
+      counted in the edge bins and only bounded by the group's exact
+      min/max. Repayment percentages are never negative.
+
+    Quantiles interpolate between order statistics like numpy's default,
+    so they carry the same bounds.
+    """
+
+    def __init__(self, keys, count, total, total_sq, minimum, maximum,
+                 histogram, value_range=SKETCH_RANGE,
+                 bin_width=SKETCH_BIN_WIDTH):
+        self.keys = keys
+        self.count = count
+        self.total = total
+        self.total_sq = total_sq
+        self.minimum = minimum
+        self.maximum = maximum
+        self.histogram = histogram
+        self.value_range = value_range
+        self.bin_width = bin_width
+
+    @staticmethod
+    def linear_bin_count(value_range=SKETCH_RANGE,
+                         bin_width=SKETCH_BIN_WIDTH):
+        low, high = value_range
+        return int(np.ceil((high - low) / bin_width))
+
+    @classmethod
+    def bin_count(cls, value_range=SKETCH_RANGE, bin_width=SKETCH_BIN_WIDTH):
+        return (cls.linear_bin_count(value_range, bin_width) +
+                SKETCH_OVERFLOW_BINS)
+
+    @classmethod
+    def bin_edges(cls, value_range=SKETCH_RANGE, bin_width=SKETCH_BIN_WIDTH):
+        """Lower edges of every bin, plus the upper edge of the last"""
+        low, high = value_range
+        linear = low + np.arange(cls.linear_bin_count(value_range,
+                                                      bin_width)) * bin_width
+        overflow = high * SKETCH_GROWTH**np.arange(SKETCH_OVERFLOW_BINS + 1)
+        return np.concatenate((linear, overflow))
+
+    @classmethod
+    def bin_positions(cls, values, value_range=SKETCH_RANGE,
+                      bin_width=SKETCH_BIN_WIDTH):
+        """Bin of each finite value"""
+        low, high = value_range
+        linear_bins = cls.linear_bin_count(value_range, bin_width)
+        positions = np.clip(np.floor((values - low) / bin_width), 0,
+                            linear_bins - 1).astype('int64')
+        above = values >= high
+        if above.any():
+            overflow = np.floor(np.log(values[above] / high) /
+                                np.log(SKETCH_GROWTH)).astype('int64')
+            positions[above] = linear_bins + np.minimum(
+                overflow, SKETCH_OVERFLOW_BINS - 1)
+        return positions
+
+    @classmethod
+    def from_values(cls, groups, values, value_range=SKETCH_RANGE,
+                    bin_width=SKETCH_BIN_WIDTH):
+        """State of values grouped by groups (aligned array-likes)
+
+        Groups are ordered like a sorted factorize: category order for
+        categoricals, chronological for periods. Missing groups and
+        non-finite values are skipped.
+        """
+        codes, keys = pd.factorize(groups, sort=True)
+        values = np.asarray(values, dtype='float64')
+        keep = (codes >= 0) & np.isfinite(values)
+        codes, values = codes[keep], values[keep]
+        size = len(keys)
+
+        count = np.bincount(codes, minlength=size)
+        total = np.bincount(codes, weights=values, minlength=size)
+        total_sq = np.bincount(codes, weights=values * values, minlength=size)
+        by_group = pd.Series(values).groupby(codes)
+        minimum = by_group.min().reindex(range(size)).to_numpy()
+        maximum = by_group.max().reindex(range(size)).to_numpy()
+
+        bins = cls.bin_count(value_range, bin_width)
+        positions = cls.bin_positions(values, value_range, bin_width)
+        histogram = np.bincount(codes * bins + positions,
+                                minlength=size * bins).reshape(size, bins)
+        return cls(pd.Index(keys), count, total, total_sq, minimum, maximum,
+                   histogram, value_range, bin_width)
+
+    @classmethod
+    def from_bins(cls, groups, bins, counts, totals, total_sqs, minimums,
+                  maximums, value_range=SKETCH_RANGE,
+                  bin_width=SKETCH_BIN_WIDTH):
+        """State from values already summed per (group, bin)
+
+        For partial aggregates computed elsewhere, e.g. a database GROUP BY
+        over the same bins as from_values uses.
+        """
+        codes, keys = pd.factorize(groups, sort=True)
+        size = len(keys)
+        bins = np.asarray(bins, dtype='int64')
+        counts = np.asarray(counts, dtype='float64')
+
+        def summed(weights):
+            return np.bincount(codes, weights=weights, minlength=size)
+
+        by_group = pd.DataFrame({'min': minimums, 'max': maximums},
+                                dtype='float64').groupby(codes)
+        width = cls.bin_count(value_range, bin_width)
+        histogram = np.bincount(codes * width + bins,
+                                weights=counts,
+                                minlength=size * width)
+        return cls(pd.Index(keys),
+                   summed(counts).astype('int64'),
+                   summed(np.asarray(totals, dtype='float64')),
+                   summed(np.asarray(total_sqs, dtype='float64')),
+                   by_group['min'].min().reindex(range(size)).to_numpy(),
+                   by_group['max'].max().reindex(range(size)).to_numpy(),
+                   histogram.astype('int64').reshape(size, width),
+                   value_range, bin_width)
+
+    def merge(self, other):
+        """Combined state of self and other; neither is modified"""
+        if (self.value_range, self.bin_width) != (other.value_range,
+                                                  other.bin_width):
+            raise ValueError("cannot merge sketches with different bins")
+        keys = self.keys.append(other.keys).unique().sort_values()
+        mine = keys.get_indexer(self.keys)
+        theirs = keys.get_indexer(other.keys)
+
+        def added(a, b):
+            result = np.zeros((len(keys), ) + a.shape[1:], dtype=a.dtype)
+            result[mine] += a
+            result[theirs] += b
+            return result
+
+        def combined(a, b, pick):
+            result = np.full(len(keys), np.nan)
+            result[mine] = a
+            result[theirs] = pick(result[theirs], b)
+            return result
+
+        return GroupedStats(keys, added(self.count, other.count),
+                            added(self.total, other.total),
+                            added(self.total_sq, other.total_sq),
+                            combined(self.minimum, other.minimum, np.fmin),
+                            combined(self.maximum, other.maximum, np.fmax),
+                            added(self.histogram, other.histogram),
+                            self.value_range, self.bin_width)
+
+    def mean(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return pd.Series(self.total / self.count, index=self.keys)
+
+    def std(self):
+        """Sample standard deviation (NaN for groups of fewer than 2)"""
+        n = self.count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.total / n
+            variance = (self.total_sq - n * mean**2) / (n - 1)
+        variance = np.where(n > 1, np.clip(variance, 0, None), np.nan)
+        return pd.Series(np.sqrt(variance), index=self.keys)
+
+    def _order_statistic(self, rank, cumulative):
+        """Estimate of each group's rank-th smallest value (1-based)"""
+        position = (cumulative < rank[:, None]).sum(axis=1)
+        position = np.minimum(position, self.histogram.shape[1] - 1)
+        rows = np.arange(len(rank))
+        before = np.where(position > 0,
+                          cumulative[rows, np.maximum(position - 1, 0)], 0)
+        in_bin = self.histogram[rows, position]
+        # Spread the bin's values evenly across it
+        with np.errstate(invalid='ignore', divide='ignore'):
+            offset = (rank - before - 0.5) / in_bin
+        edges = self.bin_edges(self.value_range, self.bin_width)
+        lower, upper = edges[position], edges[position + 1]
+        estimate = lower + np.clip(offset, 0, 1) * (upper - lower)
+        return np.clip(estimate, self.minimum, self.maximum)
+
+    def quantile(self, q):
+        """Approximate q-quantile of each group (see class docstring)"""
+        n = self.count
+        if len(n) == 0:
+            return pd.Series(np.nan, index=self.keys)
+        # Same interpolation between order statistics as numpy's default
+        rank = q * (n - 1) + 1
+        lower = np.floor(rank)
+        cumulative = self.histogram.cumsum(axis=1)
+        low = self._order_statistic(lower, cumulative)
+        high = self._order_statistic(np.minimum(lower + 1, n), cumulative)
+        estimate = low + (rank - lower) * (high - low)
+        return pd.Series(np.where(n > 0, estimate, np.nan), index=self.keys)
@@ -0,0 +1,223 @@
+import numpy as np
+import pandas as pd
+
+from utils.data_generator import loan_sizes
+from utils.instrumentation import profiled
+from utils.risk_analyzer import RISK_FLAG_BITS
+
+# Dimensions with one bitmap per distinct value
+BITMAP_DIMENSIONS = ['platform', 'vintage', 'loan_size_category',
+                     'risk_category']
+
+# Row/value comparisons per slice when building value bitmaps, which
+# bounds the temporary mask whatever the number of values
+BITMAP_CHUNK_CELLS = 1 << 20
+
+# Set-bit count of every byte, for numpy versions without bitwise_count
+_BYTE_POPCOUNT = np.array([bin(i).count('1') for i in range(256)],
+                          dtype=np.uint8)
+
+
+def _pack(mask):
+    """Boolean row mask as a bitset of little-endian uint64 words"""
+    packed = np.packbits(mask, bitorder='little')
+    padding = -len(packed) % 8
+    if padding:
+        packed = np.concatenate((packed, np.zeros(padding, dtype=np.uint8)))
+    return packed.view('<u8')
+
+
+def popcount(bits):
+    """Number of set bits in a bitset"""
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(bits).sum(dtype=np.int64))
+    return int(_BYTE_POPCOUNT[bits.view(np.uint8)].sum(dtype=np.int64))
+
+
+class BitmapIndex:
+    """Packed per-value bitsets over the rows of a loan frame
+
+    Built once per dataset version. A filter takes the OR of the bitmaps
+    of the values chosen in a dimension and the AND across dimensions, so
+    resolving and counting any combination costs a few passes over
+    len(df) / 64 words instead of a boolean mask per row and filter.
+
+    Each risk flag also gets a bitmap of the loans carrying it, read from
+    the risk_flags bitmask. Flags combine with AND, so a multi-label query
+    such as liquidity AND revenue drop risk is one more bitwise step.
+
+    funded_date is held as a bit-sliced index of day offsets: one bitmap
+    per bit of the offset, so any date range resolves in two comparisons
+    of about log2(days) bitwise steps each.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.size = len(df)
+        self.bitmaps = {}
+        for dimension in BITMAP_DIMENSIONS:
+            if dimension == 'loan_size_category' and 'amount' in df.columns:
+                values = loan_sizes(df)
+            elif dimension in df.columns:
+                values = df[dimension]
+            else:
+                continue
+            self.bitmaps[dimension] = self._value_bitmaps(values)
+
+        self.flag_bitmaps = {}
+        if 'risk_flags' in df.columns:
+            mask = df['risk_flags'].to_numpy()
+            self.flag_bitmaps = {
+                flag: _pack((mask & bit) != 0)
+                for flag, bit in RISK_FLAG_BITS.items()
+            }
+
+        self.every_row = _pack(np.ones(self.size, dtype=bool))
+        self.first_date = self.last_date = None
+        self.date_slices = []
+        self.has_date = np.zeros_like(self.every_row)
+        if 'funded_date' in df.columns and self.size:
+            days = df['funded_date'].dt.normalize()
+            self.has_date = _pack(days.notna().to_numpy())
+            if days.notna().any():
+                self.first_date, self.last_date = days.min(), days.max()
+                offsets = ((days - self.first_date).dt.days.fillna(0).to_numpy()
+                           .astype(np.int64))
+                self.date_slices = [
+                    _pack((offsets >> bit) & 1 == 1)
+                    for bit in range(int(offsets.max()).bit_length())
+                ]
+
+    def _value_bitmaps(self, values):
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes = values.cat.codes.to_numpy()
+            labels = values.cat.categories
+        else:
+            codes, labels = pd.factorize(values, sort=True)
+        # One pass over the codes in cache-sized slices: each slice is
+        # compared with every value at once and packed into its words of
+        # all the bitmaps; values that never occur are dropped at the end
+        value_codes = np.arange(len(labels), dtype=codes.dtype)[:, None]
+        # A multiple of 64 rows, so every slice fills whole bitmap words
+        chunk_rows = max(BITMAP_CHUNK_CELLS // max(len(labels), 1) // 64,
+                         1) * 64
+        packed = np.zeros((len(labels), -(-len(codes) // 64) * 8),
+                          dtype=np.uint8)
+        present = np.zeros(len(labels), dtype=bool)
+        for start in range(0, len(codes), chunk_rows):
+            chunk = codes[start:start + chunk_rows]
+            bits = np.packbits(chunk == value_codes, axis=1,
+                               bitorder='little')
+            packed[:, start // 8:start // 8 + bits.shape[1]] = bits
+            present |= bits.any(axis=1)
+        return {
+            label: packed[code].view('<u8')
+            for code, label in enumerate(labels) if present[code]
+        }
+
+    def values(self, dimension):
+        """Values of a dimension present in the data, in category order"""
+        return list(self.bitmaps.get(dimension, {}))
+
+    def _on_or_after(self, day):
+        """Rows whose funded day offset is >= day"""
+        if day <= 0:
+            return self.has_date.copy()
+        if day >> len(self.date_slices):
+            return np.zeros_like(self.has_date)
+        # Walk the bits from the top, keeping rows equal to day so far and
+        # rows already known to be greater; all in place, no temporaries
+        greater = np.zeros_like(self.has_date)
+        equal = self.has_date.copy()
+        scratch = np.empty_like(equal)
+        for bit in range(len(self.date_slices) - 1, -1, -1):
+            bit_slice = self.date_slices[bit]
+            if (day >> bit) & 1:
+                equal &= bit_slice
+            else:
+                np.bitwise_and(equal, bit_slice, out=scratch)
+                greater |= scratch
+                equal ^= scratch
+        greater |= equal
+        return greater
+
+    def date_range(self, start=None, end=None):
+        """Rows funded on days start..end inclusive (None is unbounded)"""
+        if self.first_date is None:
+            return np.zeros_like(self.has_date)
+        bits = self.has_date.copy()
+        if start is not None:
+            day = (pd.Timestamp(start).normalize() - self.first_date).days
+            bits &= self._on_or_after(day)
+        if end is not None:
+            day = (pd.Timestamp(end).normalize() - self.first_date).days
+            later = self._on_or_after(day + 1)
+            bits &= np.invert(later, out=later)
+        return bits
+
+    def match(self, filters=None, date_range=None, flags=None):
+        """Bitset of rows matching every filter
+
+        filters maps a dimension to the values to keep (any of them); an
+        empty or missing list leaves the dimension unfiltered. date_range
+        is an optional (start, end) pair of dates. flags lists risk flags
+        a row must all carry.
+        """
+        bits = self.every_row.copy()
+        for dimension, values in (filters or {}).items():
+            if not values:
+                continue
+            bitmaps = self.bitmaps.get(dimension, {})
+            chosen = np.zeros_like(bits)
+            for value in values:
+                if value in bitmaps:
+                    chosen |= bitmaps[value]
+            bits &= chosen
+        for flag in flags or []:
+            if flag not in self.flag_bitmaps:
+                return np.zeros_like(bits)
+            bits &= self.flag_bitmaps[flag]
+        if date_range is not None:
+            bits &= self.date_range(*date_range)
+        return bits
+
+    def count(self, bits):
+        return popcount(bits)
+
+    def counts(self, bits, dimension):
+        """Matching rows per value of a dimension"""
+        bitmaps = self.bitmaps.get(dimension, {})
+        return pd.Series({
+            value: popcount(bits & bitmap)
+            for value, bitmap in bitmaps.items()
+        }, dtype='int64')
+
+    def positions(self, bits):
+        """Row positions of the set bits"""
+        mask = np.unpackbits(bits.view(np.uint8),
+                             count=self.size,
+                             bitorder='little')
+        return np.flatnonzero(mask)
+
+    @profiled(rows=lambda args, result: args[0].size)
+    def summary(self, bits):
+        """KPI totals and size/risk distributions of the matching loans
+
+        Loan and per-value counts are popcounts; only the money totals
+        read the matching rows.
+        """
+        loan_count = self.count(bits)
+        rows = self.positions(bits)
+        amount = self.df['amount'].to_numpy()[rows].sum(dtype=np.int64)
+        return {
+            'totals': {
+                'amount': amount,
+                'repaid_amount': self.df['repaid_amount'].to_numpy()[rows].sum(),
+                'fees': self.df['fees'].to_numpy()[rows].sum(),
+                'loan_count': loan_count,
+                'avg_amount': amount / loan_count if loan_count else np.nan,
+            },
+            'size_counts': self.counts(bits, 'loan_size_category'),
+            'risk_counts': self.counts(bits, 'risk_category').sort_values(
+                ascending=False, kind='stable'),
+        }
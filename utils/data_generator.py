@@ -1,107 +1,415 @@
+import os
+
 import pandas as pd
 import numpy as np
 
+from utils.instrumentation import profiled
+from utils.risk_analyzer import (RISK_FLAGS, encode_risk_flags, risk_categories,
+                                 risk_flag_counts, report_flag_overlaps)
+from utils.snapshot_cache import file_fingerprint, load_snapshot, save_snapshot
+
+
+DATA_FILE = 'attached_assets/pipe_final_data.csv'
+
+# When set to 1, each CSV load prints the per-column memory report
+MEMORY_REPORT_ENV = 'DASHBOARD_MEMORY_REPORT'
+
+# Source CSV headers mapped to the names used throughout the dashboard
+COLUMN_RENAMES = {
+    'Embedded Platform Name': 'platform',
+    'SMB Name': 'business_name',
+    'Loan Amount': 'amount',
+    'Pipe Fees': 'fees',
+    'Loan Funded On': 'funded_date',
+    'Repaid Total So Far': 'repaid_amount',  # Fixed column name
+    'Liquidity Risk': 'liquidity_risk',
+    'Revenue Drop Risk': 'revenue_drop_risk',
+    'Non-Payment Risk': 'non_payment_risk'
+}
+
+# Columns identifying a loan across the book, delta files and snapshots
+LOAN_KEY = ['business_name', 'funded_date']
+
+# Pinned parse dtypes for the source CSV so every chunk of a streamed read
+# agrees on column types (funded dates are parsed in prepare_loan_data)
+CSV_DTYPES = {
+    'Embedded Platform Name': 'object',
+    'SMB Name': 'object',
+    'Loan Funded On': 'object',
+    'Loan Amount': 'int64',
+    'Pipe Fees': 'float64',
+    'Repaid Total So Far': 'float64',
+    'Liquidity Risk': 'int8',
+    'Revenue Drop Risk': 'int8',
+    'Non-Payment Risk': 'int8'
+}
+
+
+# Period frequency and label format for each cohort granularity. Labels
+# are formatted once per distinct period, never once per loan.
+COHORT_GRANULARITIES = {
+    'quarter': ('Q', lambda p: f"Q{p.quarter} {p.year}"),
+    'month': ('M', lambda p: p.strftime('%b %Y')),
+    'week': ('W', lambda p: f"Week of {p.start_time:%Y-%m-%d}"),
+}
+
+
+def cohort_periods(funded_date, granularity='quarter'):
+    """Funded dates truncated to the period of the given cohort granularity"""
+    freq, _ = COHORT_GRANULARITIES[granularity]
+    return funded_date.dt.to_period(freq)
+
+
+def cohort_labels(periods, granularity='quarter'):
+    """Display labels ('Q1 2024', 'Jan 2024', ...) for an iterable of periods"""
+    _, label = COHORT_GRANULARITIES[granularity]
+    return [label(p) for p in periods]
+
+
+def derive_cohorts(funded_date, granularity='quarter'):
+    """Ordered categorical of cohort labels for a datetime Series
+
+    Categories are in chronological order, so grouping and sorting by the
+    result work on integer codes rather than by parsing label strings.
+    """
+    periods = pd.Categorical(cohort_periods(funded_date, granularity))
+    labels = cohort_labels(periods.categories, granularity)
+    cohorts = pd.Categorical.from_codes(periods.codes,
+                                        categories=labels,
+                                        ordered=True)
+    return pd.Series(cohorts, index=funded_date.index, name='vintage')
+
+
+def vintage_period(label):
+    """Quarterly period of a vintage label ('Q1 2024' -> 2024Q1)"""
+    quarter, year = label.split()
+    return pd.Period(f"{year}{quarter}", freq='Q')
+
+
+def prepare_loan_data(df):
+    """Rename raw CSV columns and derive risk flags, category and vintage"""
+    # Clean up column names for better code readability
+    df = df.rename(columns=COLUMN_RENAMES)
+
+    # Pack the risk flags into one bitmask; risk_category is the most
+    # severe flag. Loans with several flags are reported, not dropped.
+    df['risk_flags'] = encode_risk_flags(df)
+    report_flag_overlaps(risk_flag_counts(df['risk_flags']))
+    df['risk_category'] = risk_categories(df['risk_flags'])
+
+    # Convert loan date to datetime and create vintage
+    df['funded_date'] = pd.to_datetime(df['funded_date'])
+
+    # Create vintage as a chronologically ordered quarterly cohort
+    df['vintage'] = derive_cohorts(df['funded_date'])
 
-def load_loan_data():
-    """Load loan data from CSV and transform for dashboard use"""
+    # Add default platform if missing
+    if 'platform' not in df.columns:
+        print(
+            "Warning: 'platform' column not found in CSV, adding default value"
+        )
+        df['platform'] = 'Priority'  # Default platform
+
+    return df
+
+
+# Default loan size buckets as [lower, upper) edges; amounts below the
+# first edge fall into "Other"
+DEFAULT_LOAN_SIZE_EDGES = [10000, 50000, 150000, np.inf]
+DEFAULT_LOAN_SIZE_LABELS = [
+    "Small ($10K-$50K)", "Medium ($50K-$150K)", "Large (>$150K)"
+]
+
+
+def _size_label(low, high):
+    def dollars(x):
+        return f"${x / 1000:g}K"
+
+    if np.isinf(high):
+        return f">{dollars(low)}"
+    return f"{dollars(low)}-{dollars(high)}"
+
+
+def loan_size_config(environ=os.environ):
+    """Loan size bucket (edges, labels), overridable from the environment
+
+    DASHBOARD_LOAN_SIZE_EDGES lists the lower edges of the buckets in
+    dollars, e.g. "10000,50000,150000"; the last bucket is open-ended.
+    DASHBOARD_LOAN_SIZE_LABELS optionally names the buckets, separated by
+    ";". Invalid settings are reported and the defaults used.
+    """
+    edges_setting = environ.get('DASHBOARD_LOAN_SIZE_EDGES')
+    if not edges_setting:
+        return DEFAULT_LOAN_SIZE_EDGES, DEFAULT_LOAN_SIZE_LABELS
     try:
-        # Print current directory for debugging
-        import os
-        print(f"Current directory: {os.getcwd()}")
-        print(f"Files in attached_assets: {os.listdir('attached_assets')}")
+        lower = [float(edge) for edge in edges_setting.split(',')]
+        if not lower or any(b <= a for a, b in zip(lower, lower[1:])):
+            raise ValueError("edges must be increasing")
+        edges = lower + [np.inf]
+        labels_setting = environ.get('DASHBOARD_LOAN_SIZE_LABELS')
+        if labels_setting:
+            labels = [label.strip() for label in labels_setting.split(';')]
+            if len(labels) != len(lower):
+                raise ValueError(f"{len(lower)} edges but {len(labels)} labels")
+        else:
+            labels = [_size_label(a, b) for a, b in zip(edges, edges[1:])]
+        return edges, labels
+    except ValueError as e:
+        print(f"Ignoring loan size bucket settings: {e}")
+        return DEFAULT_LOAN_SIZE_EDGES, DEFAULT_LOAN_SIZE_LABELS
+
+
+# Loan size buckets in effect for this process
+LOAN_SIZE_EDGES, LOAN_SIZE_LABELS = loan_size_config()
+
+
+def loan_size_categories(amount, edges=None, labels=None):
+    """Loan size bucket of each amount, as an ordered categorical
+
+    One binary search of every amount against the bucket edges gives the
+    bucket codes directly (int8, with "Other" as code 0). Defaults to the
+    configured LOAN_SIZE_EDGES/LOAN_SIZE_LABELS.
+    """
+    edges = LOAN_SIZE_EDGES if edges is None else edges
+    labels = LOAN_SIZE_LABELS if labels is None else labels
+    codes = np.searchsorted(np.asarray(edges[:-1], dtype='float64'),
+                            np.asarray(amount, dtype='float64'),
+                            side='right').astype('int8')
+    buckets = pd.Categorical.from_codes(codes,
+                                        categories=['Other'] + list(labels),
+                                        ordered=True)
+    return pd.Series(buckets,
+                     index=getattr(amount, 'index', None),
+                     name='loan_size_category')
+
+
+def bucket_loan_sizes(df, edges=None, labels=None):
+    """Frame with loan_size_category (re)computed from amount
+
+    The load pipeline stage for loan sizes, and the way to rebin a loaded
+    book after the bucket configuration changes: a single vectorized pass
+    over amount. Returns a shallow copy; df is not modified.
+    """
+    df = df.copy(deep=False)
+    df['loan_size_category'] = loan_size_categories(df['amount'], edges,
+                                                    labels)
+    return df
+
+
+def loan_sizes(df):
+    """df's stored loan_size_category, or buckets computed from amount"""
+    if 'loan_size_category' in df.columns:
+        return df['loan_size_category']
+    return loan_size_categories(df['amount'])
+
+
+def has_current_loan_sizes(df):
+    """Whether df's loan_size_category uses the configured buckets"""
+    sizes = df.get('loan_size_category')
+    return (sizes is not None
+            and isinstance(sizes.dtype, pd.CategoricalDtype)
+            and list(sizes.cat.categories) == ['Other'] + LOAN_SIZE_LABELS)
+
+
+# Low-cardinality dimensions stored as categoricals after load
+CATEGORICAL_COLUMNS = ['platform', 'risk_category', 'vintage']
+
+
+def compact_loan_data(df):
+    """Shrink a prepared loan frame to its compact in-memory schema
+
+    Dimensions become categoricals, risk flags int8, the risk_flags bitmask
+    uint8 and loan amounts int32.
+    Fees and repaid amounts stay float64 so portfolio totals are unchanged
+    to the cent. business_name is Arrow-backed when pyarrow is installed.
+    """
+    df = df.copy()
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    for col in RISK_FLAGS:
+        if col in df.columns:
+            df[col] = df[col].astype('int8')
+    if 'risk_flags' in df.columns:
+        df['risk_flags'] = df['risk_flags'].astype('uint8')
+    if 'amount' in df.columns and pd.api.types.is_integer_dtype(df['amount']):
+        if df['amount'].abs().max() < np.iinfo(np.int32).max:
+            df['amount'] = df['amount'].astype('int32')
+    if 'business_name' in df.columns:
+        try:
+            import pyarrow  # noqa: F401
+            df['business_name'] = df['business_name'].astype('string[pyarrow]')
+        except ImportError:
+            pass
+    return df
+
+
+def memory_report(before, after):
+    """Per-column memory use (bytes) of two frames, plus a total row"""
+    report = pd.DataFrame({
+        'before': before.memory_usage(deep=True, index=False),
+        'after': after.memory_usage(deep=True, index=False)
+    })
+    report.loc['total'] = report.sum()
+    report['before_dtype'] = before.dtypes.astype(str)
+    report['after_dtype'] = after.dtypes.astype(str)
+    report['ratio'] = (report['after'] / report['before']).round(3)
+    return report
+
+
+def order_loan_data(df):
+    """Sort loans so each platform occupies one contiguous block of rows
+
+    Within a platform, rows are ordered by funded_date (ties keep their
+    source order). The platform index (utils/platform_index.py) relies on
+    this layout to hand out per-platform views and funded-date ranges
+    without copying.
+    """
+    df = df.sort_values(['platform', 'funded_date'], kind='stable')
+    return df.reset_index(drop=True)
+
+
+def combine_categoricals(parts):
+    """Concatenate categorical Series under the union of their categories
+
+    A differing union is sorted the way a fresh load would order it:
+    alphabetically like astype('category'), or chronologically for the
+    ordered vintage column.
+    """
+    categories = parts[0].cat.categories
+    ordered = parts[0].cat.ordered
+    if any(not part.cat.categories.equals(categories) for part in parts[1:]):
+        for part in parts[1:]:
+            categories = categories.append(part.cat.categories)
+        categories = categories.unique()
+        key = vintage_period if ordered else None
+        categories = pd.Index(sorted(categories, key=key))
+    return pd.concat(
+        [part.cat.set_categories(categories, ordered=ordered) for part in parts],
+        ignore_index=True)
+
+
+def concat_loan_frames(frames):
+    """Stack frames with the same columns, keeping categorical dtypes
+
+    pd.concat falls back to object for categoricals whose categories
+    differ; this unions them instead.
+    """
+    frames = [frame for frame in frames if not frame.empty] or frames[:1]
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    columns = {}
+    for col in frames[0].columns:
+        parts = [frame[col] for frame in frames]
+        if all(isinstance(p.dtype, pd.CategoricalDtype) for p in parts):
+            columns[col] = combine_categoricals(parts)
+        else:
+            columns[col] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def _sync_sql_db(df, file_path, sql_db):
+    if sql_db is not None:
+        # Imported here: the SQL backend builds on this module
+        from utils.sql_backend import LoanDatabase
+        LoanDatabase(sql_db, file_path).sync(df)
+    return df
+
+
+@profiled()
+def load_loan_data(file_path=DATA_FILE, use_snapshot=True, sql_db=None):
+    """Load loan data from CSV and transform for dashboard use
+
+    The prepared frame is persisted as a columnar snapshot beside the CSV
+    (see utils/snapshot_cache.py) and reused while the CSV is unchanged.
+    The CSV is parsed again whenever the snapshot is missing or stale.
+
+    With sql_db (a database file path) the loaded frame is also written to
+    that SQL database (see utils/sql_backend.py) unless it already holds
+    this version of the CSV.
+    """
+    try:
+        if use_snapshot:
+            df = load_snapshot(file_path)
+            if df is not None:
+                # Snapshots keep the buckets they were written with
+                if not has_current_loan_sizes(df):
+                    df = bucket_loan_sizes(df)
+                return _sync_sql_db(df, file_path, sql_db)
+            fingerprint = file_fingerprint(file_path)
 
         # Load CSV file
-        file_path = 'attached_assets/pipe_final_data.csv'
-        print(f"Attempting to load file: {file_path}")
         df = pd.read_csv(file_path)
 
-        # Print column names for debugging
-        print(f"CSV columns: {df.columns.tolist()}")
-        
-        # Print max loan amount with more details
-        try:
-            max_amount = df['Loan Amount'].max()
-            print(f"Max loan amount: ${max_amount:,.0f}")
-            print(f"Sample data: {df['Loan Amount'].head().tolist()}")
-        except Exception as e:
-            print(f"Error calculating max loan amount: {e}")
-            print(f"Columns available: {df.columns.tolist()}")
-
-        # Clean up column names for better code readability
-        df = df.rename(
-            columns={
-                'Embedded Platform Name': 'platform',
-                'SMB Name': 'business_name',
-                'Loan Amount': 'amount',
-                'Pipe Fees': 'fees',
-                'Loan Funded On': 'funded_date',
-                'Repaid Total So Far': 'repaid_amount',  # Fixed column name
-                'Liquidity Risk': 'liquidity_risk',
-                'Revenue Drop Risk': 'revenue_drop_risk',
-                'Non-Payment Risk': 'non_payment_risk'
-            })
-
-        print("DataFrame head:")
-        print(df.head())  # Use parentheses to actually call the method
-
-        # Set risk category based on flags (mutually exclusive in this dataset)
-        df['risk_category'] = 'No Risk'
-        df.loc[df['liquidity_risk'] == 1, 'risk_category'] = 'Liquidity Risk'
-        df.loc[df['revenue_drop_risk'] == 1,
-               'risk_category'] = 'Revenue Drop Risk'
-        df.loc[df['non_payment_risk'] == 1,
-               'risk_category'] = 'Non-Payment Risk'
-
-        # Convert loan date to datetime and create vintage
-        df['funded_date'] = pd.to_datetime(df['funded_date'])
-
-        # Create vintage using quarter calculation
-        df['quarter'] = df['funded_date'].dt.quarter
-        df['year'] = df['funded_date'].dt.year
-        df['vintage'] = 'Q' + df['quarter'].astype(
-            str) + ' ' + df['year'].astype(str)
-
-        # Drop helper columns
-        df = df.drop(['quarter', 'year'], axis=1)
-
-        # Add default platform if missing
-        if 'platform' not in df.columns:
-            print(
-                "Warning: 'platform' column not found in CSV, adding default value"
-            )
-            df['platform'] = 'Priority'  # Default platform
-
-        return df
+        prepared = prepare_loan_data(df)
+        df = order_loan_data(bucket_loan_sizes(compact_loan_data(prepared)))
+        if os.environ.get(MEMORY_REPORT_ENV) == '1':
+            print("Memory by column (bytes):")
+            print(memory_report(prepared, df))
+        del prepared
+
+        if use_snapshot and save_snapshot(file_path, df, fingerprint):
+            # Serve the memory-mapped copy so cold and warm loads share the
+            # same read-only, page-cache-backed buffers
+            snapshot = load_snapshot(file_path)
+            if snapshot is not None:
+                df = snapshot
+
+        return _sync_sql_db(df, file_path, sql_db)
     except Exception as e:
         print(f"Error loading data: {str(e)}")
         return pd.DataFrame()  # Return empty DataFrame if loading fails
 
 
-def get_vintage_data(df):
-    """Calculate vintage performance metrics"""
-    if df.empty:
-        return pd.DataFrame()
+def build_vintage_data(vintage_totals, risk_by_vintage):
+    """Assemble vintage metrics from pre-aggregated per-vintage inputs
 
-    # Group by vintage and calculate metrics
-    vintage_data = df.groupby('vintage').agg({
-        'amount': 'sum',
-        'repaid_amount': 'sum'
-    }).reset_index()
+    vintage_totals is indexed by vintage with summed amount/repaid_amount;
+    risk_by_vintage is a vintage x risk_category table of loan counts.
+    """
+    vintage_data = vintage_totals[['amount', 'repaid_amount']].reset_index()
 
     # Calculate repayment rate
     vintage_data['repayment_rate'] = vintage_data[
         'repaid_amount'] / vintage_data['amount']
-    
+
     # Add risk analysis metrics
-    risk_by_vintage = df.groupby(['vintage', 'risk_category']).size().unstack(fill_value=0).reset_index()
+    risk_by_vintage = risk_by_vintage.reset_index()
     if 'Non-Payment Risk' in risk_by_vintage.columns:
         risk_by_vintage['total_loans'] = risk_by_vintage.drop('vintage', axis=1).sum(axis=1)
-        risk_by_vintage['non_payment_risk_pct'] = (risk_by_vintage['Non-Payment Risk'] / 
+        risk_by_vintage['non_payment_risk_pct'] = (risk_by_vintage['Non-Payment Risk'] /
                                                   risk_by_vintage['total_loans'] * 100)
-        
+
         # Merge risk metrics with vintage data
-        vintage_data = pd.merge(vintage_data, 
-                              risk_by_vintage[['vintage', 'Non-Payment Risk', 'non_payment_risk_pct']], 
+        vintage_data = pd.merge(vintage_data,
+                              risk_by_vintage[['vintage', 'Non-Payment Risk', 'non_payment_risk_pct']],
                               on='vintage', how='left')
 
     return vintage_data
+
+
+@profiled()
+def get_vintage_data(df, granularity='quarter'):
+    """Calculate vintage performance metrics
+
+    granularity='month' or 'week' groups by finer cohorts derived from the
+    already-parsed funded_date instead of the quarterly vintage column.
+    df may also be a LoanQuery (utils/sql_backend.py), grouped in SQL.
+    """
+    if not isinstance(df, pd.DataFrame):
+        return df.vintage_data(granularity)
+    if df.empty:
+        return pd.DataFrame()
+
+    vintage = df['vintage']
+    if granularity != 'quarter':
+        vintage = derive_cohorts(df['funded_date'], granularity)
+
+    # Group by vintage and calculate metrics
+    vintage_totals = df.groupby(vintage, observed=True).agg({
+        'amount': 'sum',
+        'repaid_amount': 'sum'
+    })
+    risk_by_vintage = df.groupby([vintage, 'risk_category'], observed=True).size().unstack(fill_value=0)
+
+    return build_vintage_data(vintage_totals, risk_by_vintage)
@@ -0,0 +1,220 @@
+import hashlib
+import os
+import threading
+import time
+
+import pandas as pd
+
+from utils.bitmap_index import BitmapIndex
+from utils.data_generator import DATA_FILE, load_loan_data
+from utils.delta_ingest import read_delta, delta_files, apply_loan_delta
+from utils.platform_index import PlatformIndex
+from utils.risk_cube import build_risk_cube
+from utils.search_index import SearchIndex
+from utils.snapshot_cache import source_version
+
+
+class LoanDataset:
+    """One loaded version of the loan book and everything derived from it
+
+    Instances are shared by every session in the process and must be
+    treated as read-only: derive new frames instead of assigning into
+    df, cube or the other members. Numeric columns loaded from the
+    snapshot are memory-mapped and reject in-place writes.
+    """
+
+    def __init__(self, df, version=None, cube=None, source_version=None,
+                 deltas=(), platform_index=None):
+        self.version = version
+        # Version of the source file this was loaded from, before deltas
+        self.source_version = source_version or version
+        # Delta files applied on top of the source, in order
+        self.deltas = tuple(deltas)
+        self.loaded_at = time.time()
+        self.df = df
+        self.platform_index = (PlatformIndex(df) if platform_index is None
+                               else platform_index)
+        self._search_index = None
+        self._bitmap_index = None
+        # Aggregate once per version; every view is answered from the cube
+        self.cube = build_risk_cube(df) if cube is None else cube
+
+    @property
+    def search_index(self):
+        """Search index over df, built on first use"""
+        if self._search_index is None:
+            self._search_index = SearchIndex(self.df)
+        return self._search_index
+
+    @property
+    def bitmap_index(self):
+        """Per-value bitsets behind the cross-filters, built on first use
+
+        SQL mode never reads them, and a version replaced by the next
+        delta before anyone filters never pays for them.
+        """
+        if self._bitmap_index is None:
+            self._bitmap_index = BitmapIndex(self.df)
+        return self._bitmap_index
+
+    def with_delta(self, delta, name):
+        """New version with delta's loans upserted; self is left unchanged
+
+        The cube and platform index are updated by the delta rather than
+        rebuilt; the search and bitmap indexes are built on first use.
+        """
+        df, cube, platform_index, stats = apply_loan_delta(
+            self.df, self.cube, delta, self.platform_index)
+        version = hashlib.sha256(
+            f"{self.version}:{name}".encode()).hexdigest()[:12]
+        dataset = LoanDataset(df,
+                              version,
+                              cube=cube,
+                              source_version=self.source_version,
+                              deltas=self.deltas + (name, ),
+                              platform_index=platform_index)
+        print(f"Applied delta {name}: {stats['inserted']} new, "
+              f"{stats['updated']} updated loans")
+        return dataset
+
+    @classmethod
+    def empty(cls):
+        return cls(pd.DataFrame(columns=['platform']))
+
+    @property
+    def age_seconds(self):
+        return time.time() - self.loaded_at
+
+
+class DatasetStore:
+    """Process-wide holder of the current LoanDataset with explicit refresh
+
+    get() returns the active version without copying it. refresh() builds
+    a new version when the source file changed (or when forced) and swaps
+    it in atomically; sessions holding the previous LoanDataset keep using
+    it until their next rerun.
+
+    start_refresher() moves that work off the request path: a daemon
+    thread polls the source and rebuilds in the background, so readers
+    keep being served the previous version (stale-while-revalidate) and
+    only the very first load blocks.
+
+    With delta_dir set, CSVs of new or updated loans dropped there are
+    upserted into the active version (see utils/delta_ingest.py) without a
+    full reload, and re-applied in name order after one.
+    """
+
+    def __init__(self, file_path=DATA_FILE, max_age=None, delta_dir=None):
+        self.file_path = file_path
+        self.delta_dir = delta_dir
+        # Seconds after which a version is rebuilt even if the source did
+        # not change; None keeps it until the file changes
+        self.max_age = max_age
+        self.refreshing = False
+        self.last_checked = None
+        self.last_error = None
+        self._current = None
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def current(self):
+        return self._current
+
+    def get(self):
+        """The active dataset, loading it on first use"""
+        dataset = self._current
+        if dataset is None:
+            dataset = self.refresh()
+        return dataset
+
+    def is_stale(self):
+        """True when the source file no longer matches the active version"""
+        dataset = self._current
+        if dataset is None:
+            return True
+        if self.max_age is not None and dataset.age_seconds > self.max_age:
+            return True
+        return dataset.source_version != source_version(self.file_path)
+
+    def refresh(self, force=False):
+        """Load a new version if the source changed; returns the active one"""
+        with self._lock:
+            self.last_checked = time.time()
+            if force or self.is_stale():
+                self.refreshing = True
+                try:
+                    version = source_version(self.file_path)
+                    df = load_loan_data(self.file_path)
+                    # load_loan_data reports failures as an empty frame;
+                    # never replace good data with that
+                    if df.empty and self._current is not None:
+                        raise ValueError(f"no rows loaded from {self.file_path}")
+                    dataset = self._apply_pending(LoanDataset(df, version))
+                finally:
+                    self.refreshing = False
+                # Single reference assignment: readers see either the old
+                # or the new version, never a partly built one
+                self._current = dataset
+            return self._current
+
+    def ingest(self, path, name=None):
+        """Upsert one delta file into the active version and swap it in"""
+        delta = read_delta(path)
+        with self._lock:
+            dataset = self.get().with_delta(delta, name or path)
+            self._current = dataset
+            return dataset
+
+    def ingest_pending(self):
+        """Apply delta_dir files not yet in the active version"""
+        with self._lock:
+            dataset = self._apply_pending(self.get())
+            self._current = dataset
+            return dataset
+
+    def _delta_name(self, name, path):
+        # A rewritten file counts as a new delta
+        stat = os.stat(path)
+        return f"{name}@{stat.st_mtime_ns}:{stat.st_size}"
+
+    def _apply_pending(self, dataset):
+        for name, path in delta_files(self.delta_dir):
+            key = self._delta_name(name, path)
+            if key not in dataset.deltas:
+                dataset = dataset.with_delta(read_delta(path), key)
+        return dataset
+
+    def start_refresher(self, interval=60):
+        """Poll the source and delta_dir every interval seconds in a thread
+
+        Idempotent; returns the thread. A failed rebuild is recorded in
+        last_error and the previous version stays active.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return self._thread
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._refresh_loop,
+                                        args=(interval, ),
+                                        name='dataset-refresher',
+                                        daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop_refresher(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _refresh_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+                self.ingest_pending()
+                self.last_error = None
+            except Exception as e:
+                if str(e) != self.last_error:
+                    print(f"Background refresh of {self.file_path} failed: {e}")
+                self.last_error = str(e)
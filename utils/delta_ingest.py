@@ -0,0 +1,148 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.data_generator import (CSV_DTYPES, LOAN_KEY, prepare_loan_data,
+                                  compact_loan_data, bucket_loan_sizes,
+                                  concat_loan_frames, order_loan_data)
+from utils.instrumentation import profiled
+from utils.platform_index import PlatformIndex
+from utils.risk_cube import build_risk_cube, apply_cube_delta
+
+# Files picked up from a delta directory
+DELTA_SUFFIX = '.csv'
+
+
+@profiled()
+def read_delta(path):
+    """Read a delta CSV of new or updated loans into the prepared layout
+
+    Delta files use the source CSV schema. When a key appears more than
+    once in the file, the last row wins.
+    """
+    raw = pd.read_csv(path, dtype=CSV_DTYPES)
+    missing = set(CSV_DTYPES) - set(raw.columns)
+    if missing:
+        raise ValueError(f"{path} is missing columns: {sorted(missing)}")
+    delta = bucket_loan_sizes(compact_loan_data(prepare_loan_data(raw)))
+    delta = delta.drop_duplicates(LOAN_KEY, keep='last')
+    return delta.reset_index(drop=True)
+
+
+def delta_files(delta_dir):
+    """Delta CSVs in delta_dir, oldest name first, as (name, path) pairs"""
+    if not delta_dir or not os.path.isdir(delta_dir):
+        return []
+    names = sorted(name for name in os.listdir(delta_dir)
+                   if name.endswith(DELTA_SUFFIX))
+    return [(name, os.path.join(delta_dir, name)) for name in names]
+
+
+def matched_rows(df, delta, platform_index):
+    """Positions in df of loans whose key also appears in delta
+
+    A match shares the delta row's funded_date, and every platform block
+    of df is sorted by it, so the candidates are found by binary search
+    per block instead of a scan of the book; only they are compared on
+    the full key.
+    """
+    days = np.unique(delta['funded_date'].to_numpy())
+    candidates = []
+    for start, stop in platform_index.ranges.values():
+        dates = platform_index.funded_dates[start:stop]
+        lower = np.searchsorted(dates, days, side='left')
+        upper = np.searchsorted(dates, days, side='right')
+        candidates += [
+            np.arange(start + first, start + last)
+            for first, last in zip(lower, upper) if last > first
+        ]
+    if not candidates:
+        return np.array([], dtype=np.intp)
+    candidates = np.sort(np.concatenate(candidates))
+    existing = pd.MultiIndex.from_frame(df[LOAN_KEY].iloc[candidates])
+    incoming = pd.MultiIndex.from_frame(delta[LOAN_KEY])
+    return candidates[existing.isin(incoming)]
+
+
+def _merged_by_date(block, incoming):
+    """Rows of two funded_date-sorted frames merged into one sorted frame"""
+    merged = concat_loan_frames([block, incoming.sort_values(
+        'funded_date', kind='stable')])
+    # Two sorted runs: the stable sort merges them in linear time
+    order = np.argsort(merged['funded_date'].to_numpy(), kind='stable')
+    return merged.iloc[order]
+
+
+def _grouped_pieces(df, delta, replaced, ranges):
+    """Row blocks that stack into df minus replaced rows plus delta, with
+    each platform still in one contiguous, funded_date-sorted block
+
+    Every platform contributes its existing rows (a view unless some are
+    replaced or new ones arrive), merged by date with its incoming rows,
+    so the result needs a single concatenation instead of a re-sort of
+    the whole book. Returns (platform, block) pairs in platform order.
+    """
+    incoming = delta[df.columns].groupby('platform', observed=True,
+                                          sort=False)
+    incoming = {platform: rows for platform, rows in incoming}
+    pieces = []
+    for platform in sorted(set(ranges) | set(incoming)):
+        start, stop = ranges.get(platform, (0, 0))
+        block = df.iloc[start:stop]
+        dropped = replaced[(replaced >= start) & (replaced < stop)]
+        if len(dropped):
+            keep = np.ones(stop - start, dtype=bool)
+            keep[dropped - start] = False
+            block = block.iloc[keep]
+        if platform in incoming:
+            block = _merged_by_date(block, incoming[platform])
+        pieces.append((platform, block))
+    return pieces
+
+
+def _stacked_ranges(pieces):
+    """Row range of each non-empty piece once the pieces are stacked"""
+    ranges = {}
+    stop = 0
+    for platform, block in pieces:
+        if len(block):
+            ranges[platform] = (stop, stop + len(block))
+            stop += len(block)
+    return ranges
+
+
+@profiled()
+def apply_loan_delta(df, cube, delta, platform_index=None):
+    """Upsert delta rows into a loan frame, its risk cube and platform index
+
+    Returns the new (df, cube, platform_index, stats). Rows of df sharing
+    a key with the delta are replaced and the rest appended; the cube is
+    updated from the replaced and incoming rows only (see
+    apply_cube_delta), and the platform ranges follow from the block
+    sizes, so everything but the one copy of the columns that rebuilds
+    the frame costs in proportion to the delta. Inputs are not modified.
+    """
+    if platform_index is None:
+        platform_index = PlatformIndex(df)
+    if delta.empty:
+        return df, cube, platform_index, {'inserted': 0, 'updated': 0}
+    if df.empty:
+        new_df = order_loan_data(delta)
+        return (new_df, build_risk_cube(delta), PlatformIndex(new_df), {
+            'inserted': len(delta),
+            'updated': 0
+        })
+
+    replaced = matched_rows(df, delta, platform_index)
+    old_rows = df.iloc[replaced]
+    pieces = _grouped_pieces(df, delta, replaced, platform_index.ranges)
+    new_df = concat_loan_frames([block for _, block in pieces])
+    new_index = PlatformIndex(new_df, ranges=_stacked_ranges(pieces))
+    new_cube = apply_cube_delta(cube, build_risk_cube(delta),
+                                build_risk_cube(old_rows))
+    stats = {
+        'inserted': len(delta) - len(replaced),
+        'updated': len(replaced)
+    }
+    return new_df, new_cube, new_index, stats
@@ -0,0 +1,132 @@
+import gzip
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from utils.instrumentation import profiled
+
+# Label shown in the UI -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'CSV (gzip)': ('csv.gz', 'application/gzip'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+EXPORT_CHUNK_ROWS = 100_000
+MAX_CACHED_EXPORTS = 8
+
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), 'smb_dashboard_exports')
+
+# Process-wide cache of finished export files, least recently used first
+_exports = OrderedDict()
+_exports_lock = threading.Lock()
+
+
+def _chunks(data, chunk_rows):
+    """data as frames of at most chunk_rows rows
+
+    data is a DataFrame, sliced here, or an iterable of frames that is
+    already chunked, such as LoanQuery.chunks().
+    """
+    if not isinstance(data, pd.DataFrame):
+        return data
+    return (data.iloc[start:start + chunk_rows]
+            for start in range(0, max(len(data), 1), chunk_rows))
+
+
+def _write_csv(chunks, handle):
+    header = True
+    for chunk in chunks:
+        chunk.to_csv(handle, header=header, index=False)
+        header = False
+
+
+def _write_parquet(chunks, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            elif not table.schema.equals(writer.schema):
+                # A later chunk may infer other types, e.g. for a column
+                # that is all null in it; align it with the first
+                table = table.cast(writer.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_export(data, export_format, path, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Write data to path in export_format, one chunk at a time
+
+    data is a DataFrame, converted chunk_rows rows at a time, or an
+    iterable of frames with the same columns, written as they arrive.
+    """
+    chunks = _chunks(data, chunk_rows)
+    if export_format == 'CSV':
+        with open(path, 'w', newline='') as handle:
+            _write_csv(chunks, handle)
+    elif export_format == 'CSV (gzip)':
+        with gzip.open(path, 'wt', newline='') as handle:
+            _write_csv(chunks, handle)
+    elif export_format == 'Parquet':
+        _write_parquet(chunks, path)
+    else:
+        raise ValueError(f"Unknown export format: {export_format}")
+
+
+def cached_export(key):
+    """Path of a finished export for key, or None if not built yet"""
+    with _exports_lock:
+        path = _exports.get(key)
+        if path is None or not os.path.exists(path):
+            _exports.pop(key, None)
+            return None
+        _exports.move_to_end(key)
+        return path
+
+
+@profiled()
+def build_export(data, export_format, key):
+    """Write data to a temp file for key and remember it, evicting the oldest
+
+    data is anything write_export accepts. key should identify everything
+    the rows depend on, e.g. (dataset version, platform, search term,
+    columns, format).
+    """
+    path = cached_export(key)
+    if path is not None:
+        return path
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    extension, _ = EXPORT_FORMATS[export_format]
+    fd, tmp_path = tempfile.mkstemp(suffix=f".{extension}.tmp",
+                                    dir=EXPORT_DIR)
+    os.close(fd)
+    try:
+        write_export(data, export_format, tmp_path)
+        path = tmp_path[:-len('.tmp')]
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+    with _exports_lock:
+        _exports[key] = path
+        evicted = []
+        while len(_exports) > MAX_CACHED_EXPORTS:
+            evicted.append(_exports.popitem(last=False)[1])
+    for old_path in evicted:
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass
+    return path
@@ -0,0 +1,120 @@
+import threading
+from collections import OrderedDict
+
+from utils.instrumentation import profiled
+
+# Plotly figures kept process-wide; a few KB each for this dashboard
+MAX_CACHED_FIGURES = 128
+
+# Aggregated frames behind the charts and tables of a view
+MAX_CACHED_VIEWS = 64
+
+# Row orders of the Raw Data grid, one int64 position per loan each
+MAX_CACHED_SORT_ORDERS = 8
+
+
+class LRUCache:
+    """Thread-safe mapping that evicts its least recently used entry
+
+    Values are shared by every session, so callers must not mutate them.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_build(self, key, build):
+        """Cached value for key, calling build() on a miss
+
+        build runs outside the lock; two sessions missing the same key at
+        once both build it and the later result is kept.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = build()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_figures = LRUCache(MAX_CACHED_FIGURES)
+_views = LRUCache(MAX_CACHED_VIEWS)
+_sort_orders = LRUCache(MAX_CACHED_SORT_ORDERS)
+
+
+@profiled(rows=lambda args, result: None)
+def cached_figure(chart_id, platform, data_version, build_figure):
+    """Plotly figure of a chart, built by build_figure() once per key
+
+    The key is (chart_id, platform, data_version), so any new dataset
+    version misses. build_figure should do the chart's aggregation as
+    well, so a hit skips it too. Without a data_version nothing is cached.
+    The figure is shared across sessions; st.plotly_chart only reads it.
+    """
+    if data_version is None:
+        return build_figure()
+    return _figures.get_or_build((chart_id, platform, data_version),
+                                 build_figure)
+
+
+def cached_view(view_id, platform, data_version, build):
+    """Aggregated frame of a view, built by build() once per key
+
+    Same keying as cached_figure. The result is shared across
+    sessions: copy it before modifying.
+    """
+    if data_version is None:
+        return build()
+    return _views.get_or_build((view_id, platform, data_version), build)
+
+
+def cached_sort_order(sort_column, descending, platform, data_version,
+                      build):
+    """Row order of a platform's loans, built by build() once per key
+
+    Keyed by (sort_column, descending, platform, data_version); kept in a
+    smaller cache than views since each order holds a position per loan.
+    """
+    if data_version is None:
+        return build()
+    return _sort_orders.get_or_build(
+        (sort_column, descending, platform, data_version), build)
+
+
+def cache_stats():
+    """Size and hit/miss counts of the figure, view and sort order caches"""
+    return {
+        name: {
+            'entries': len(cache),
+            'hits': cache.hits,
+            'misses': cache.misses
+        }
+        for name, cache in [('figures', _figures), ('views', _views),
+                            ('sort_orders', _sort_orders)]
+    }
@@ -0,0 +1,216 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import deque
+
+import pandas as pd
+
+# Finished runs kept in memory for the diagnostics panel and exports
+HISTORY_SIZE = 200
+
+# When set, every finished profiled run is appended to this JSON lines file
+PROFILE_LOG_ENV = 'DASHBOARD_PROFILE_LOG'
+
+_local = threading.local()
+_history = deque(maxlen=HISTORY_SIZE)
+_history_lock = threading.Lock()
+_tracing_lock = threading.Lock()
+_tracing_runs = 0
+
+
+class RunProfile:
+    """Timings recorded during one script run (one Streamlit rerun)"""
+
+    def __init__(self, label):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.started = time.time()
+        self.records = []
+        self._stack = []
+
+    def to_frame(self):
+        return pd.DataFrame(self.records)
+
+
+def _start_tracing():
+    global _tracing_runs
+    with _tracing_lock:
+        if _tracing_runs == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracing_runs += 1
+
+
+def _stop_tracing():
+    global _tracing_runs
+    with _tracing_lock:
+        _tracing_runs -= 1
+        if _tracing_runs == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def start_run(label='rerun', enabled=True):
+    """Begin profiling the current thread's run; returns None if disabled
+
+    Peak memory comes from tracemalloc, which is process-wide: with several
+    sessions profiling at once, peaks include their concurrent allocations.
+    """
+    end_run()
+    if not enabled:
+        return None
+    _start_tracing()
+    run = RunProfile(label)
+    _local.run = run
+    return run
+
+
+def current_run():
+    return getattr(_local, 'run', None)
+
+
+def end_run():
+    """Finish the current thread's run and add it to the shared history"""
+    run = current_run()
+    if run is None:
+        return None
+    _local.run = None
+    _stop_tracing()
+    with _history_lock:
+        _history.append(run)
+    log_path = os.environ.get(PROFILE_LOG_ENV)
+    if log_path:
+        with open(log_path, 'a') as f:
+            f.write(to_jsonl(run.records))
+    return run
+
+
+def history():
+    """Finished runs, oldest first"""
+    with _history_lock:
+        return list(_history)
+
+
+def _default_rows(args, result):
+    for value in args:
+        if isinstance(value, pd.DataFrame):
+            return len(value)
+    if isinstance(result, pd.DataFrame):
+        return len(result)
+    return None
+
+
+class track:
+    """Context manager recording wall time, rows and peak memory of a block
+
+    Does nothing unless a profiled run is active on this thread. Nested
+    blocks are recorded with their depth, and a child's peak also counts
+    towards its parent's.
+    """
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+        self.run = None
+
+    def __enter__(self):
+        self.run = current_run()
+        if self.run is None:
+            return self
+        current, peak = tracemalloc.get_traced_memory()
+        if self.run._stack:
+            parent = self.run._stack[-1]
+            parent['child_peak'] = max(parent['child_peak'], peak)
+        tracemalloc.reset_peak()
+        self.frame = {'start_current': current, 'child_peak': 0}
+        self.run._stack.append(self.frame)
+        self.started = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.run is None:
+            return False
+        seconds = time.perf_counter() - self.start
+        _, peak = tracemalloc.get_traced_memory()
+        self.run._stack.pop()
+        peak = max(peak, self.frame['child_peak'])
+        if self.run._stack:
+            parent = self.run._stack[-1]
+            parent['child_peak'] = max(parent['child_peak'], peak)
+        self.run.records.append({
+            'run_id': self.run.run_id,
+            'label': self.run.label,
+            'timestamp': self.started,
+            'name': self.name,
+            'depth': len(self.run._stack),
+            'seconds': seconds,
+            'rows': self.rows,
+            'peak_bytes': max(0, peak - self.frame['start_current']),
+            'error': exc_type.__name__ if exc_type else None,
+        })
+        return False
+
+
+def profiled(name=None, rows=_default_rows):
+    """Decorator recording each call with track()
+
+    rows(args, result) gives the rows scanned; by default the length of
+    the first DataFrame argument, else of a DataFrame result.
+    """
+
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if current_run() is None:
+                return func(*args, **kwargs)
+            with track(label) as block:
+                result = func(*args, **kwargs)
+                block.rows = rows(args, result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def to_jsonl(records):
+    """Records as JSON lines, one record per line"""
+    return ''.join(json.dumps(record) + '\n' for record in records)
+
+
+def to_prometheus(runs, prefix='dashboard_component'):
+    """Prometheus text exposition of per-component totals over runs"""
+    records = pd.DataFrame([r for run in runs for r in run.records])
+    lines = [
+        f"# HELP {prefix}_seconds Wall time spent per component.",
+        f"# TYPE {prefix}_seconds summary",
+    ]
+    if records.empty:
+        return '\n'.join(lines) + '\n'
+
+    totals = records.groupby('name').agg(seconds_sum=('seconds', 'sum'),
+                                         count=('seconds', 'size'))
+    last = records.groupby('name').last()
+    for component, row in totals.iterrows():
+        labels = f'{{component="{component}"}}'
+        lines.append(f"{prefix}_seconds_sum{labels} {row['seconds_sum']:.6f}")
+        lines.append(f"{prefix}_seconds_count{labels} {int(row['count'])}")
+
+    for metric, column, help_text in [
+        ('last_seconds', 'seconds', 'Wall time of the latest call.'),
+        ('last_rows', 'rows', 'Rows scanned by the latest call.'),
+        ('last_peak_bytes', 'peak_bytes',
+         'Peak traced allocation of the latest call.'),
+    ]:
+        lines.append(f"# HELP {prefix}_{metric} {help_text}")
+        lines.append(f"# TYPE {prefix}_{metric} gauge")
+        for component, value in last[column].items():
+            if pd.notna(value):
+                lines.append(
+                    f'{prefix}_{metric}{{component="{component}"}} {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+
+class PlatformIndex:
+    """Row ranges of each platform in a loan frame ordered by platform
+
+    Built once per dataset. select() returns an iloc slice of the frame,
+    which is a view over the existing column buffers rather than a copy,
+    and 'All' returns the frame itself.
+
+    Within each platform rows are sorted by funded_date, so the loans of
+    a date range are found by binary search and are again one slice.
+
+    ranges may be passed when the caller built df block by block and
+    already knows them (see apply_loan_delta); the layout is then trusted
+    rather than checked.
+    """
+
+    def __init__(self, df, ranges=None):
+        checked = ranges is None
+        if checked and not df.empty and not _is_grouped(df['platform']):
+            raise ValueError(
+                "PlatformIndex needs rows grouped by platform; "
+                "load them with load_loan_data or order_loan_data")
+        self.df = df
+        if ranges is None:
+            ranges = _platform_ranges(df['platform']) if not df.empty else {}
+        self.ranges = ranges
+        self.funded_dates = np.array([], dtype='datetime64[ns]')
+        if 'funded_date' in df.columns:
+            self.funded_dates = df['funded_date'].to_numpy()
+            if checked and not _is_date_sorted(self.funded_dates,
+                                               self.ranges):
+                raise ValueError(
+                    "PlatformIndex needs each platform's rows sorted by "
+                    "funded_date; load them with load_loan_data or "
+                    "order_loan_data")
+
+    @property
+    def platforms(self):
+        """Platform names present in the data, sorted"""
+        return sorted(self.ranges)
+
+    def select(self, platform):
+        """Loans of one platform as a zero-copy view ('All' for every loan)"""
+        if platform == 'All':
+            return self.df
+        start, stop = self.ranges.get(platform, (0, 0))
+        return self.df.iloc[start:stop]
+
+    def blocks(self, platform):
+        """Funded_date-sorted views of the loans of platform
+
+        One view per platform; 'All' gives every platform's block.
+        """
+        names = self.platforms if platform == 'All' else [platform]
+        return [self.select(name) for name in names if name in self.ranges]
+
+    def date_range(self, platform, start=None, end=None):
+        """Row range (start, stop) of platform's loans funded in [start, end)
+
+        start and end are anything pd.Timestamp accepts; None leaves that
+        side open. Two binary searches over the platform's block.
+        """
+        first, last = self.ranges.get(platform, (0, 0))
+        dates = self.funded_dates[first:last]
+        lower = 0 if start is None else np.searchsorted(
+            dates, np.datetime64(pd.Timestamp(start), 'ns'), side='left')
+        upper = len(dates) if end is None else np.searchsorted(
+            dates, np.datetime64(pd.Timestamp(end), 'ns'), side='left')
+        return first + int(lower), first + int(max(lower, upper))
+
+    def select_dates(self, platform, start=None, end=None):
+        """Loans of platform funded in [start, end)
+
+        A zero-copy view for one platform; for 'All' the per-platform
+        slices are gathered into one frame.
+        """
+        if platform != 'All':
+            first, last = self.date_range(platform, start, end)
+            return self.df.iloc[first:last]
+        rows = [
+            np.arange(*self.date_range(name, start, end))
+            for name in self.platforms
+        ]
+        return self.df.iloc[np.concatenate(rows) if rows else []]
+
+
+def _codes(platform):
+    if isinstance(platform.dtype, pd.CategoricalDtype):
+        return platform.cat.codes.to_numpy(), platform.cat.categories
+    codes, uniques = pd.factorize(platform, sort=False)
+    return codes, uniques
+
+
+def _is_grouped(platform):
+    codes, _ = _codes(platform)
+    # Grouped means every value appears in exactly one run
+    starts = np.flatnonzero(np.diff(codes)) + 1
+    return len(np.unique(codes)) == len(starts) + 1
+
+
+def _is_date_sorted(dates, ranges):
+    # Dates may only step back where a new platform block starts
+    descents = np.flatnonzero(dates[1:] < dates[:-1]) + 1
+    starts = {start for start, _ in ranges.values()}
+    return all(int(row) in starts for row in descents)
+
+
+def _platform_ranges(platform):
+    codes, labels = _codes(platform)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(codes)) + 1))
+    stops = np.append(starts[1:], len(codes))
+    return {
+        str(labels[codes[start]]): (int(start), int(stop))
+        for start, stop in zip(starts, stops) if codes[start] >= 0
+    }
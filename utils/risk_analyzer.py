@@ -1,8 +1,140 @@
+import numpy as np
 import pandas as pd
+from utils.instrumentation import profiled
 
+RISK_CATEGORIES = [
+    'No Risk', 'Liquidity Risk', 'Revenue Drop Risk', 'Non-Payment Risk'
+]
 
+# Loan-level flag columns and their risk category, least to most severe.
+# Flag i is bit i of the uint8 risk_flags bitmask, so up to eight flags fit.
+RISK_FLAG_CATEGORIES = {
+    'liquidity_risk': 'Liquidity Risk',
+    'revenue_drop_risk': 'Revenue Drop Risk',
+    'non_payment_risk': 'Non-Payment Risk',
+}
+RISK_FLAGS = list(RISK_FLAG_CATEGORIES)
+RISK_FLAG_BITS = {flag: 1 << bit for bit, flag in enumerate(RISK_FLAGS)}
+
+# Number of distinct bitmask values
+RISK_MASKS = 1 << len(RISK_FLAGS)
+
+
+def encode_risk_flags(df):
+    """The loan flag columns packed into one uint8 bitmask per loan"""
+    mask = np.zeros(len(df), dtype=np.uint8)
+    for bit, flag in enumerate(RISK_FLAGS):
+        if flag in df.columns:
+            mask |= (df[flag].to_numpy() == 1).astype(np.uint8) << bit
+    return pd.Series(mask, index=df.index, name='risk_flags')
+
+
+def _mask_category_codes(categories):
+    """Code in categories of every bitmask's most severe flag"""
+    codes = [categories.index('No Risk')]
+    for mask in range(1, RISK_MASKS):
+        flag = RISK_FLAGS[mask.bit_length() - 1]
+        codes.append(categories.index(RISK_FLAG_CATEGORIES[flag]))
+    return np.array(codes, dtype=np.int8)
+
+
+def risk_categories(mask):
+    """risk_category of each bitmask, as a categorical
+
+    A loan with several flags gets its most severe one. Each bitmask is
+    looked up in a table of all RISK_MASKS values, so this is one gather
+    however many flags there are. Categories are the ones present, sorted
+    like astype('category').
+    """
+    categories = sorted(RISK_CATEGORIES)
+    codes = _mask_category_codes(categories)[np.asarray(mask)]
+    risk_category = pd.Series(pd.Categorical.from_codes(codes, categories),
+                              index=mask.index,
+                              name='risk_category')
+    return risk_category.cat.remove_unused_categories()
+
+
+def risk_flag_counts(mask):
+    """Loans per bitmask value, indexed by the bitmask (one bincount)"""
+    return np.bincount(np.asarray(mask, dtype=np.uint8), minlength=RISK_MASKS)
+
+
+def _required_bits(flags):
+    return np.uint8(sum(RISK_FLAG_BITS[flag] for flag in flags))
+
+
+def count_with_flags(mask_counts, flags):
+    """Loans carrying every one of flags, read off risk_flag_counts"""
+    required = _required_bits(flags)
+    masks = np.arange(len(mask_counts))
+    return int(mask_counts[(masks & required) == required].sum())
+
+
+def match_risk_flags(mask, flags):
+    """Boolean mask of loans carrying every one of flags
+
+    E.g. ['liquidity_risk', 'revenue_drop_risk'] for liquidity AND revenue
+    drop risk; one pass over the bitmask column whatever the number of
+    flags.
+    """
+    required = _required_bits(flags)
+    return (mask & required) == required
+
+
+def flag_totals(mask_counts):
+    """Loans carrying each flag, read off risk_flag_counts"""
+    return pd.Series({flag: count_with_flags(mask_counts, [flag])
+                      for flag in RISK_FLAGS}, dtype='int64')
+
+
+def _flags_of(mask):
+    return tuple(flag for flag, bit in RISK_FLAG_BITS.items() if mask & bit)
+
+
+def flag_overlaps(mask_counts):
+    """Loans per combination of two or more flags, from risk_flag_counts"""
+    return {
+        _flags_of(mask): int(loans)
+        for mask, loans in enumerate(mask_counts)
+        if loans and mask & (mask - 1)
+    }
+
+
+def report_flag_overlaps(mask_counts):
+    """Print a warning when any loan carries more than one risk flag"""
+    overlaps = flag_overlaps(mask_counts)
+    if overlaps:
+        combinations = ", ".join(f"{' + '.join(flags)}: {loans}"
+                                 for flags, loans in overlaps.items())
+        print(f"Warning: {sum(overlaps.values())} loans carry more than one "
+              f"risk flag ({combinations}); risk_category shows the most "
+              f"severe")
+    return overlaps
+
+
+def loan_risk_flags(df):
+    """df's stored risk_flags bitmask, or one encoded from the flags"""
+    if 'risk_flags' in df.columns:
+        return df['risk_flags']
+    return encode_risk_flags(df)
+
+
+def risk_flag_combinations(df):
+    """Loans per combination of risk flags, overlapping ones included"""
+    mask_counts = risk_flag_counts(loan_risk_flags(df))
+    rows = [(" + ".join(_flags_of(mask)) or 'none', int(loans))
+            for mask, loans in enumerate(mask_counts) if loans]
+    return pd.DataFrame(rows, columns=['flags', 'loans'])
+
+
+@profiled()
 def get_risk_summary(df):
-    """Generate risk summary statistics that works with any number of platforms"""
+    """Generate risk summary statistics that works with any number of platforms
+
+    df may also be a LoanQuery (utils/sql_backend.py), grouped in SQL.
+    """
+    if not isinstance(df, pd.DataFrame):
+        return df.risk_summary()
     if len(df['platform'].unique()) == 0:
         # Create empty DataFrame with expected columns if no data
         return pd.DataFrame(columns=[
@@ -11,14 +143,18 @@ def get_risk_summary(df):
         ])
 
     # Group by platform and risk category
-    risk_summary = df.groupby(['platform',
-                               'risk_category']).size().unstack(fill_value=0)
+    risk_summary = df.groupby(['platform', 'risk_category'],
+                              observed=True).size().unstack(fill_value=0)
+
+    return build_risk_summary(risk_summary)
+
+
+def build_risk_summary(risk_counts):
+    """Turn a platform x risk_category table of counts into row shares"""
+    risk_summary = risk_counts.copy()
 
     # Ensure all expected risk categories exist
-    for category in [
-            'No Risk', 'Liquidity Risk', 'Revenue Drop Risk',
-            'Non-Payment Risk'
-    ]:
+    for category in RISK_CATEGORIES:
         if category not in risk_summary.columns:
             risk_summary[category] = 0
 
@@ -28,12 +164,22 @@ def get_risk_summary(df):
     return risk_summary_pct
 
 
-def calculate_risk_metrics(df):
-    """Calculate additional risk metrics"""
-    metrics = {
-        'total_at_risk': len(df[df['risk_category'] != 'No Risk']),
-        'liquidity_risk': len(df[df['liquidity_risk'] == 1]),
-        'revenue_drop_risk': len(df[df['revenue_drop_risk'] == 1]),
-        'non_payment_risk': len(df[df['non_payment_risk'] == 1]),
-    }
+def build_risk_metrics(total_at_risk, flag_counts):
+    """Assemble the risk metrics dict from an at-risk count and flag sums"""
+    metrics = {'total_at_risk': int(total_at_risk)}
+    for flag in RISK_FLAGS:
+        metrics[flag] = int(flag_counts.get(flag, 0))
     return metrics
+
+
+@profiled()
+def calculate_risk_metrics(df):
+    """Calculate additional risk metrics
+
+    df may also be a LoanQuery (utils/sql_backend.py), counted in SQL.
+    """
+    if not isinstance(df, pd.DataFrame):
+        return df.risk_metrics()
+    # Every count comes from one bincount of the risk_flags bitmask
+    mask_counts = risk_flag_counts(loan_risk_flags(df))
+    return build_risk_metrics(mask_counts[1:].sum(), flag_totals(mask_counts))
@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+
+from utils.instrumentation import profiled
+from utils.data_generator import (build_vintage_data, loan_sizes,
+                                  concat_loan_frames)
+from utils.risk_analyzer import (RISK_FLAGS, build_risk_summary,
+                                 build_risk_metrics)
+
+# Dimensions the cube is keyed by; every dashboard view groups by a subset
+CUBE_DIMENSIONS = ['platform', 'vintage', 'risk_category', 'loan_size_category']
+
+# Additive measures held per cube cell. The repayment_pct sums let the
+# velocity mean/std be recovered without going back to loan level.
+CUBE_MEASURES = [
+    'loan_count', 'amount', 'repaid_amount', 'fees', 'repayment_pct_sum',
+    'repayment_pct_sq_sum'
+] + RISK_FLAGS
+
+
+@profiled()
+def build_risk_cube(df):
+    """Aggregate the loan book into one row per populated dimension cell
+
+    The cube is built once per dataset (a few hundred rows for the bundled
+    data) and every dashboard view is then answered by summing cube rows
+    instead of rescanning the loans.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=CUBE_DIMENSIONS + CUBE_MEASURES)
+
+    repayment_pct = df['repaid_amount'] / df['amount'] * 100
+    loans = pd.DataFrame({
+        'platform': df['platform'],
+        'vintage': df['vintage'],
+        'risk_category': df['risk_category'],
+        'loan_size_category': loan_sizes(df),
+        'loan_count': 1,
+        'amount': df['amount'].astype('int64'),
+        'repaid_amount': df['repaid_amount'],
+        'fees': df['fees'],
+        'repayment_pct_sum': repayment_pct,
+        'repayment_pct_sq_sum': repayment_pct**2,
+    })
+    for flag in RISK_FLAGS:
+        loans[flag] = (df[flag] == 1).astype('int64')
+
+    cube = loans.groupby(CUBE_DIMENSIONS, observed=True,
+                         sort=True)[CUBE_MEASURES].sum()
+    return cube.reset_index()
+
+
+@profiled()
+def apply_cube_delta(cube, added, removed=None):
+    """Cube updated by the cubes of added and removed loans
+
+    Removed loans (the old versions of updated rows) are subtracted and
+    added loans summed in, so the cost depends on the cube and delta sizes
+    rather than the loan book. Cells left with no loans are dropped.
+    """
+    parts = [cube, added]
+    if removed is not None and not removed.empty:
+        removed = removed.copy()
+        removed[CUBE_MEASURES] = -removed[CUBE_MEASURES]
+        parts.append(removed)
+    parts = [part for part in parts if not part.empty]
+    if not parts:
+        return cube
+
+    combined = concat_loan_frames(parts)
+    cube = combined.groupby(CUBE_DIMENSIONS, observed=True,
+                            sort=True)[CUBE_MEASURES].sum()
+    return cube[cube['loan_count'] > 0].reset_index()
+
+
+def slice_cube(cube, platform):
+    """Cube rows for one platform ('All' returns the cube unchanged)"""
+    if platform == 'All':
+        return cube
+    return cube[cube['platform'] == platform]
+
+
+def _rollup(cube, by, measures):
+    return cube.groupby(by, observed=True)[measures].sum()
+
+
+def cube_portfolio_totals(cube):
+    """Headline KPIs: deployed, returned, fees, loan count and average size"""
+    loan_count = int(cube['loan_count'].sum())
+    amount = cube['amount'].sum()
+    return {
+        'amount': amount,
+        'repaid_amount': cube['repaid_amount'].sum(),
+        'fees': cube['fees'].sum(),
+        'loan_count': loan_count,
+        'avg_amount': amount / loan_count if loan_count else np.nan,
+    }
+
+
+def cube_size_counts(cube):
+    """Loan counts per loan_size_category"""
+    return _rollup(cube, 'loan_size_category', 'loan_count')
+
+
+def cube_risk_counts(cube):
+    """Loan counts per risk_category, largest first like value_counts()"""
+    counts = _rollup(cube, 'risk_category', 'loan_count')
+    return counts.sort_values(ascending=False, kind='stable')
+
+
+def cube_vintage_risk(cube):
+    """vintage x risk_category table of loan counts"""
+    return _rollup(cube, ['vintage', 'risk_category'],
+                   'loan_count').unstack(fill_value=0)
+
+
+@profiled()
+def cube_vintage_data(cube):
+    """get_vintage_data answered from the cube"""
+    if cube.empty:
+        return pd.DataFrame()
+    vintage_totals = _rollup(cube, 'vintage', ['amount', 'repaid_amount'])
+    return build_vintage_data(vintage_totals, cube_vintage_risk(cube))
+
+
+@profiled()
+def cube_risk_summary(cube):
+    """get_risk_summary answered from the cube"""
+    risk_counts = _rollup(cube, ['platform', 'risk_category'],
+                          'loan_count').unstack(fill_value=0)
+    return build_risk_summary(risk_counts)
+
+
+@profiled()
+def cube_risk_metrics(cube):
+    """calculate_risk_metrics answered from the cube"""
+    at_risk = cube.loc[cube['risk_category'] != 'No Risk', 'loan_count'].sum()
+    return build_risk_metrics(at_risk, cube[RISK_FLAGS].sum())
+
+
+@profiled()
+def cube_repayment_velocity(cube, median_repayment_pct=None):
+    """Per-vintage repayment velocity from the cube's moment sums
+
+    Mean and sample std of the loan-level repayment percentage come from
+    count/sum/sum-of-squares. A median is not additive, so it is taken from
+    median_repayment_pct (a Series indexed by vintage) when supplied.
+    """
+    if cube.empty:
+        return pd.DataFrame()
+
+    totals = _rollup(cube, 'vintage', [
+        'loan_count', 'amount', 'repaid_amount', 'repayment_pct_sum',
+        'repayment_pct_sq_sum'
+    ])
+    n = totals['loan_count']
+    mean = totals['repayment_pct_sum'] / n
+    variance = ((totals['repayment_pct_sq_sum'] - n * mean**2) /
+                (n - 1)).where(n > 1)
+
+    velocity_data = pd.DataFrame({
+        'avg_repayment_pct': mean,
+        'median_repayment_pct': np.nan,
+        'std_repayment_pct': np.sqrt(variance.clip(lower=0)),
+        'loan_count': n,
+        'total_amount': totals['amount'],
+        'total_repaid': totals['repaid_amount'],
+    })
+    if median_repayment_pct is not None:
+        velocity_data['median_repayment_pct'] = median_repayment_pct.reindex(
+            velocity_data.index)
+
+    # Calculate overall repayment rate
+    velocity_data['overall_repayment_rate'] = velocity_data[
+        'total_repaid'] / velocity_data['total_amount'] * 100
+
+    return velocity_data.reset_index()
@@ -0,0 +1,164 @@
+import shlex
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from utils.instrumentation import profiled
+
+# Query prefixes accepted for field-scoped terms, e.g. "risk:non-payment"
+FIELD_ALIASES = {
+    'name': 'business_name',
+    'business': 'business_name',
+    'business_name': 'business_name',
+    'smb': 'business_name',
+    'platform': 'platform',
+    'vintage': 'vintage',
+    'risk': 'risk_category',
+    'risk_category': 'risk_category',
+}
+
+SEARCH_FIELDS = ['business_name', 'platform', 'vintage', 'risk_category']
+
+
+class _FieldIndex:
+    """Distinct lowercased values of one column plus a code per row
+
+    A term is resolved against the distinct values first (a handful for
+    platform/vintage/risk, one per SMB for names), then mapped to rows
+    with a single lookup-table gather over the codes.
+    """
+
+    def __init__(self, values, with_trigrams=False):
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes = values.cat.codes.to_numpy()
+            uniques = values.cat.categories
+        else:
+            codes, uniques = pd.factorize(values)
+        self.codes = codes
+        self.values = np.array([str(v).lower() for v in uniques], dtype=object)
+
+        # Sorted copy for prefix lookups via binary search
+        self.sort_order = np.argsort(self.values, kind='stable')
+        self.sorted_values = self.values[self.sort_order]
+
+        self.trigrams = None
+        if with_trigrams:
+            postings = defaultdict(list)
+            for value_id, value in enumerate(self.values):
+                for gram in {value[i:i + 3] for i in range(len(value) - 2)}:
+                    postings[gram].append(value_id)
+            self.trigrams = {
+                gram: np.array(ids, dtype=np.int32)
+                for gram, ids in postings.items()
+            }
+
+    def _substring_candidates(self, term):
+        if self.trigrams is None or len(term) < 3:
+            return np.arange(len(self.values))
+        grams = sorted({term[i:i + 3] for i in range(len(term) - 2)},
+                       key=lambda g: len(self.trigrams.get(g, ())))
+        candidates = self.trigrams.get(grams[0])
+        if candidates is None:
+            return np.empty(0, dtype=np.int32)
+        for gram in grams[1:]:
+            candidates = np.intersect1d(candidates,
+                                        self.trigrams.get(gram, ()),
+                                        assume_unique=True)
+            if len(candidates) == 0:
+                break
+        return candidates
+
+    def match_values(self, term, prefix=False):
+        """Ids of distinct values matching term (substring, or prefix)"""
+        if prefix:
+            start = np.searchsorted(self.sorted_values, term, side='left')
+            stop = np.searchsorted(self.sorted_values, term + '\uffff',
+                                   side='left')
+            return self.sort_order[start:stop]
+        candidates = self._substring_candidates(term)
+        # Trigrams only narrow the candidates; confirm the full substring
+        hits = pd.Series(self.values[candidates]).str.contains(term,
+                                                               regex=False)
+        return candidates[hits.to_numpy()]
+
+    def row_mask(self, value_ids):
+        lookup = np.zeros(len(self.values) + 1, dtype=bool)
+        lookup[value_ids] = True
+        # Missing values have code -1, which indexes the trailing False
+        return lookup[self.codes]
+
+
+class SearchIndex:
+    """Prebuilt index over business_name, platform, vintage and risk_category
+
+    Queries are whitespace-separated terms that must all match. A bare term
+    matches any indexed field; "field:value" restricts it to one field
+    (see FIELD_ALIASES). Matching is a case-insensitive substring, or a
+    prefix when the term ends with "*". Quote values containing spaces:
+    platform:"housecall pro".
+
+    Build it once per dataset version on a frame with a 0..n-1 RangeIndex.
+    """
+
+    def __init__(self, df):
+        self.size = len(df)
+        self.fields = {
+            field: _FieldIndex(df[field],
+                               with_trigrams=(field == 'business_name'))
+            for field in SEARCH_FIELDS if field in df.columns
+        }
+
+    @staticmethod
+    def parse(query):
+        """Split a query into (field or None, term, is_prefix) triples"""
+        try:
+            tokens = shlex.split(query)
+        except ValueError:
+            tokens = query.split()
+        terms = []
+        for token in tokens:
+            field = None
+            name, sep, value = token.partition(':')
+            if sep and name.lower() in FIELD_ALIASES:
+                field, token = FIELD_ALIASES[name.lower()], value
+            token = token.lower()
+            prefix = token.endswith('*')
+            token = token.rstrip('*')
+            if token:
+                terms.append((field, token, prefix))
+        return terms
+
+    def _term_mask(self, field, term, prefix):
+        fields = [field] if field else list(self.fields)
+        mask = np.zeros(self.size, dtype=bool)
+        for name in fields:
+            index = self.fields.get(name)
+            if index is None:
+                continue
+            value_ids = index.match_values(term, prefix)
+            if len(value_ids):
+                mask |= index.row_mask(value_ids)
+        return mask
+
+    def search(self, query):
+        """Sorted row positions matching every term of query"""
+        mask = None
+        for field, term, prefix in self.parse(query):
+            term_mask = self._term_mask(field, term, prefix)
+            mask = term_mask if mask is None else mask & term_mask
+            if not mask.any():
+                break
+        if mask is None:
+            return np.arange(self.size)
+        return np.flatnonzero(mask)
+
+    @profiled('SearchIndex.filter', rows=lambda args, result: args[0].size)
+    def filter(self, df, query):
+        """Rows of df (the indexed frame or a slice of it) matching query"""
+        rows = self.search(query)
+        index = df.index
+        if isinstance(index, pd.RangeIndex) and index.step == 1:
+            rows = rows[(rows >= index.start) & (rows < index.stop)]
+            return df.iloc[rows - index.start]
+        return df[index.isin(rows)]
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+# Bump whenever the prepared frame changes shape or dtypes so stale
+# snapshots written by an older version are ignored instead of reused.
+SNAPSHOT_SCHEMA_VERSION = 7
+
+
+def snapshot_paths(source_path):
+    """Return the (data, metadata) paths of the snapshot kept beside a CSV"""
+    base = f"{source_path}.snapshot"
+    return f"{base}.feather", f"{base}.json"
+
+
+def file_fingerprint(source_path, with_hash=True):
+    """Describe a source file by size, mtime and (optionally) content hash"""
+    stat = os.stat(source_path)
+    fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if with_hash:
+        digest = hashlib.sha256()
+        with open(source_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        fingerprint['sha256'] = digest.hexdigest()
+    return fingerprint
+
+
+def source_version(source_path):
+    """Short identifier of the current content of a source file
+
+    Derived from size, mtime and the snapshot schema version, so it changes
+    whenever the CSV is replaced or the prepared layout changes. Used to key
+    caches of anything computed from the loaded data.
+    """
+    fingerprint = file_fingerprint(source_path, with_hash=False)
+    key = f"{fingerprint['size']}:{fingerprint['mtime_ns']}:{SNAPSHOT_SCHEMA_VERSION}"
+    return hashlib.sha256(key.encode()).hexdigest()[:12]
+
+
+def _read_metadata(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_metadata(meta_path, metadata):
+    tmp_path = f"{meta_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(metadata, f)
+    os.replace(tmp_path, meta_path)
+
+
+def load_snapshot(source_path):
+    """Load the prepared frame for source_path, or None if no valid snapshot
+
+    Size and mtime are checked first; when only the mtime moved (e.g. the
+    file was touched or copied) the content hash decides whether the
+    snapshot is still valid.
+    """
+    data_path, meta_path = snapshot_paths(source_path)
+    metadata = _read_metadata(meta_path)
+    if metadata is None or not os.path.exists(data_path):
+        return None
+    if metadata.get('schema_version') != SNAPSHOT_SCHEMA_VERSION:
+        return None
+
+    try:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+    except ImportError:
+        return None
+
+    current = file_fingerprint(source_path, with_hash=False)
+    if current['size'] != metadata.get('size'):
+        return None
+    if current['mtime_ns'] != metadata.get('mtime_ns'):
+        current = file_fingerprint(source_path)
+        if current['sha256'] != metadata.get('sha256'):
+            return None
+        # Same content under a new mtime: refresh the key so the next load
+        # can skip hashing again.
+        metadata.update(current)
+        _write_metadata(meta_path, metadata)
+
+    # split_blocks lets numeric and datetime columns point straight into
+    # the memory-mapped file (read-only, shared through the page cache), and
+    # strings stay Arrow-backed instead of becoming Python objects. Saved
+    # frames have a RangeIndex, so the pandas metadata is not needed.
+    def arrow_strings(arrow_type):
+        if arrow_type in (pa.string(), pa.large_string()):
+            return pd.StringDtype('pyarrow')
+        return None
+
+    try:
+        table = feather.read_table(data_path, memory_map=True)
+        return table.to_pandas(split_blocks=True,
+                               ignore_metadata=True,
+                               types_mapper=arrow_strings)
+    except Exception as e:
+        print(f"Ignoring unreadable snapshot {data_path}: {e}")
+        return None
+
+
+def save_snapshot(source_path, df, fingerprint=None):
+    """Persist a prepared frame beside source_path, keyed by its fingerprint
+
+    Pass the fingerprint taken *before* reading the source so a file that
+    changes mid-load is never recorded under the new content's key.
+    """
+    try:
+        import pyarrow.feather as feather
+    except ImportError:
+        return False
+
+    data_path, meta_path = snapshot_paths(source_path)
+    metadata = dict(fingerprint or file_fingerprint(source_path))
+    metadata['schema_version'] = SNAPSHOT_SCHEMA_VERSION
+
+    try:
+        # Uncompressed so later loads can memory-map the columns directly.
+        tmp_path = f"{data_path}.tmp"
+        feather.write_feather(df.reset_index(drop=True), tmp_path,
+                              compression='uncompressed')
+        os.replace(tmp_path, data_path)
+        _write_metadata(meta_path, metadata)
+        return True
+    except Exception as e:
+        print(f"Could not write snapshot {data_path}: {e}")
+        return False
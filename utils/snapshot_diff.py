@@ -0,0 +1,185 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.data_generator import LOAN_KEY, load_loan_data, concat_loan_frames
+from utils.instrumentation import profiled
+from utils.risk_analyzer import RISK_CATEGORIES
+
+# Per-loan attributes taken from the latest snapshot holding the loan
+LOAN_ATTRIBUTES = ['platform', 'vintage', 'amount']
+
+SECONDS_PER_DAY = 86_400
+
+
+def _risk_codes(risk_category):
+    """risk_category as int8 positions in RISK_CATEGORIES"""
+    return pd.Categorical(risk_category,
+                          categories=RISK_CATEGORIES).codes.astype('int8')
+
+
+class SnapshotHistory:
+    """Repayment and risk history of a loan book across N snapshots
+
+    Loans are matched on LOAN_KEY and laid out once in key order, so each
+    snapshot is held as one aligned column: repaid is a float64
+    (snapshots x loans) array, NaN where a loan is absent, and risk an
+    int8 array of RISK_CATEGORIES codes, -1 where absent. Snapshot i was
+    taken at as_of[i]; snapshots are kept oldest first.
+    """
+
+    def __init__(self, frames, as_of):
+        if len(frames) != len(as_of):
+            raise ValueError("need one as_of timestamp per snapshot")
+        # Equal timestamps would give zero-day intervals (infinite
+        # velocities) and an arbitrary snapshot order
+        if pd.DatetimeIndex(as_of).has_duplicates:
+            raise ValueError("snapshots need distinct as_of timestamps")
+        order = np.argsort(pd.DatetimeIndex(as_of), kind='stable')
+        self.as_of = pd.DatetimeIndex(as_of)[order]
+        frames = [frames[i] for i in order]
+        stacked = concat_loan_frames([
+            frame[LOAN_KEY + LOAN_ATTRIBUTES +
+                  ['repaid_amount', 'risk_category']] for frame in frames
+        ])
+        snapshot = np.repeat(np.arange(len(frames)),
+                             [len(frame) for frame in frames])
+
+        # Sorted-key merge of all snapshots at once: order every row by
+        # (business_name, funded_date, position) and number the key runs.
+        # Within a run rows are in snapshot order.
+        names = pd.factorize(stacked['business_name'], sort=True)[0]
+        dates = stacked['funded_date'].to_numpy().view('int64')
+        by_key = np.lexsort((np.arange(len(stacked)), dates, names))
+        names, dates, snapshot = names[by_key], dates[by_key], snapshot[by_key]
+        new_loan = np.ones(len(by_key), dtype=bool)
+        new_loan[1:] = (names[1:] != names[:-1]) | (dates[1:] != dates[:-1])
+        loan_ids = np.cumsum(new_loan) - 1
+        loan_count = int(loan_ids[-1]) + 1 if len(loan_ids) else 0
+
+        # A key repeated within one snapshot keeps its last row
+        last_in_snapshot = np.ones(len(by_key), dtype=bool)
+        last_in_snapshot[:-1] = ((loan_ids[1:] != loan_ids[:-1]) |
+                                 (snapshot[1:] != snapshot[:-1]))
+        rows = by_key[last_in_snapshot]
+        ids = loan_ids[last_in_snapshot]
+        snaps = snapshot[last_in_snapshot]
+
+        self.repaid = np.full((len(frames), loan_count), np.nan)
+        self.repaid[snaps, ids] = stacked['repaid_amount'].to_numpy()[rows]
+        self.risk = np.full((len(frames), loan_count), -1, dtype='int8')
+        self.risk[snaps, ids] = _risk_codes(stacked['risk_category'])[rows]
+
+        # The last row of each key run comes from the loan's latest snapshot
+        latest = by_key[np.append(new_loan[1:], True)] if loan_count else []
+        self.loans = stacked[LOAN_KEY + LOAN_ATTRIBUTES].iloc[latest]
+        self.loans = self.loans.reset_index(drop=True)
+
+    @classmethod
+    def from_files(cls, paths, as_of=None):
+        """Load snapshot CSVs; as_of defaults to each file's mtime
+
+        Each file goes through load_loan_data, so repeated loads reuse its
+        compact columnar snapshot. Files copied or checked out together
+        often share an mtime; pass as_of explicitly for those, since equal
+        timestamps raise ValueError.
+        """
+        if as_of is None:
+            as_of = [
+                pd.Timestamp(os.path.getmtime(path), unit='s')
+                for path in paths
+            ]
+        frames = [load_loan_data(path) for path in paths]
+        return cls(frames, as_of)
+
+    def __len__(self):
+        return len(self.as_of)
+
+    def _interval(self, start, end):
+        start, end = range(len(self))[start], range(len(self))[end]
+        if start >= end:
+            raise ValueError("start snapshot must precede end snapshot")
+        days = (self.as_of[end] - self.as_of[start]).total_seconds()
+        return start, end, days / SECONDS_PER_DAY
+
+    @profiled(rows=lambda args, result: len(result))
+    def loan_deltas(self, start=0, end=-1):
+        """Per-loan repayment change between two snapshots
+
+        Loans missing from either snapshot get NaN deltas. Velocity is
+        dollars repaid per day; pct_points_per_day is the same relative to
+        the loan amount.
+        """
+        start, end, days = self._interval(start, end)
+        repaid_start = self.repaid[start]
+        repaid_end = self.repaid[end]
+        delta = repaid_end - repaid_start
+        amount = self.loans['amount'].to_numpy()
+
+        deltas = self.loans.copy()
+        deltas['repaid_start'] = repaid_start
+        deltas['repaid_end'] = repaid_end
+        deltas['repaid_delta'] = delta
+        deltas['velocity'] = delta / days if days else np.nan
+        deltas['pct_points_per_day'] = (delta / amount * 100 /
+                                        days if days else np.nan)
+        deltas['risk_start'] = pd.Categorical.from_codes(
+            self.risk[start], categories=RISK_CATEGORIES)
+        deltas['risk_end'] = pd.Categorical.from_codes(
+            self.risk[end], categories=RISK_CATEGORIES)
+        deltas['risk_changed'] = (self.risk[start] != self.risk[end]) & (
+            self.risk[start] >= 0) & (self.risk[end] >= 0)
+        return deltas
+
+    @profiled()
+    def vintage_deltas(self, start=0, end=-1, platform='All'):
+        """Per-vintage repayment change over loans present in both snapshots"""
+        start, end, days = self._interval(start, end)
+        deltas = self.loan_deltas(start, end)
+        present = deltas['repaid_delta'].notna()
+        if platform != 'All':
+            present &= deltas['platform'] == platform
+        deltas = deltas[present]
+
+        vintage_deltas = deltas.groupby('vintage', observed=True).agg(
+            loan_count=('repaid_delta', 'size'),
+            total_amount=('amount', 'sum'),
+            repaid_start=('repaid_start', 'sum'),
+            repaid_end=('repaid_end', 'sum'),
+            repaid_delta=('repaid_delta', 'sum'),
+            median_velocity=('velocity', 'median'),
+            risk_changes=('risk_changed', 'sum'))
+        vintage_deltas['velocity'] = vintage_deltas['repaid_delta'] / days
+        vintage_deltas['pct_points_per_day'] = (
+            vintage_deltas['repaid_delta'] / vintage_deltas['total_amount'] *
+            100 / days)
+        return vintage_deltas.reset_index()
+
+    def velocity_series(self, platform='All'):
+        """vintage_deltas for every pair of consecutive snapshots, stacked
+
+        Each row carries the as_of of the interval's end snapshot.
+        """
+        frames = []
+        for end in range(1, len(self)):
+            frame = self.vintage_deltas(end - 1, end, platform)
+            frame.insert(0, 'as_of', self.as_of[end])
+            frames.append(frame)
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def risk_transitions(self, start=0, end=-1):
+        """RISK_CATEGORIES x RISK_CATEGORIES counts of loans moving between
+        categories (rows: start snapshot, columns: end snapshot)"""
+        start, end, _ = self._interval(start, end)
+        before, after = self.risk[start], self.risk[end]
+        both = (before >= 0) & (after >= 0)
+        size = len(RISK_CATEGORIES)
+        counts = np.bincount(before[both].astype('int64') * size +
+                             after[both],
+                             minlength=size * size).reshape(size, size)
+        return pd.DataFrame(counts,
+                            index=pd.Index(RISK_CATEGORIES, name='from'),
+                            columns=pd.Index(RISK_CATEGORIES, name='to'))
@@ -0,0 +1,479 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import pandas as pd
+
+from utils.aggregates import (GroupedStats, SKETCH_RANGE, SKETCH_BIN_WIDTH,
+                              SKETCH_GROWTH)
+from utils.data_generator import (DATA_FILE, CSV_DTYPES, COHORT_GRANULARITIES,
+                                  LOAN_SIZE_EDGES, LOAN_SIZE_LABELS,
+                                  prepare_loan_data, compact_loan_data,
+                                  bucket_loan_sizes,
+                                  derive_cohorts, cohort_labels,
+                                  build_vintage_data)
+from utils.instrumentation import profiled
+from utils.risk_analyzer import (RISK_CATEGORIES, RISK_FLAGS,
+                                 build_risk_summary, build_risk_metrics,
+                                 encode_risk_flags)
+from utils.risk_cube import CUBE_DIMENSIONS, CUBE_MEASURES
+from utils.search_index import SEARCH_FIELDS, SearchIndex
+from utils.snapshot_cache import source_version
+from utils.streaming_ingest import DEFAULT_CHUNKSIZE
+
+# Bump whenever the loans table changes so older database files are rebuilt
+SQL_SCHEMA_VERSION = 1
+
+LOANS_TABLE = """
+CREATE TABLE loans (
+    platform TEXT NOT NULL,
+    business_name TEXT,
+    funded_date TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    fees REAL,
+    repaid_amount REAL,
+    liquidity_risk INTEGER,
+    revenue_drop_risk INTEGER,
+    non_payment_risk INTEGER,
+    risk_category TEXT NOT NULL
+)
+"""
+
+LOAN_COLUMNS = [
+    'platform', 'business_name', 'funded_date', 'amount', 'fees',
+    'repaid_amount'
+] + RISK_FLAGS + ['risk_category']
+
+# Cohort key of funded_date per granularity, parsed back with pd.Period.
+# Weeks end on Sunday like pandas' 'W' periods.
+COHORT_KEYS = {
+    'quarter': "strftime('%Y', funded_date) || 'Q' || "
+    "((CAST(strftime('%m', funded_date) AS INTEGER) + 2) / 3)",
+    'month': "strftime('%Y-%m', funded_date)",
+    'week': "date(funded_date, 'weekday 0')",
+}
+
+# Same expression order as the pandas path, so values match bit for bit
+REPAYMENT_PCT = "repaid_amount / amount * 100"
+
+# Vintage label ('Q1 2024') of funded_date, as searched by SearchIndex
+VINTAGE_LABEL = ("'Q' || ((CAST(strftime('%m', funded_date) AS INTEGER) + 2)"
+                 " / 3) || ' ' || strftime('%Y', funded_date)")
+
+# risk_flags bitmask of a row, like encode_risk_flags
+RISK_FLAGS_MASK = " + ".join(f"({flag} = 1) * {1 << bit}"
+                             for bit, flag in enumerate(RISK_FLAGS))
+
+
+def _size_case(params):
+    """SQL CASE bucketing amount like loan_size_categories"""
+    labels = ['Other'] + LOAN_SIZE_LABELS
+    clauses = []
+    for i, edge in enumerate(LOAN_SIZE_EDGES[:-1]):
+        params[f'size_edge_{i}'] = edge
+        params[f'size_label_{i}'] = labels[i]
+        clauses.append(f"WHEN amount < :size_edge_{i} THEN :size_label_{i}")
+    params['size_label_last'] = labels[len(LOAN_SIZE_EDGES) - 1]
+    return f"CASE {' '.join(clauses)} ELSE :size_label_last END"
+
+
+def _like_pattern(term, prefix):
+    """LIKE pattern matching term as a substring, or a prefix"""
+    escaped = (term.replace('\\', '\\\\').replace('%', '\\%')
+               .replace('_', '\\_'))
+    return f"{escaped}%" if prefix else f"%{escaped}%"
+
+
+def _search_conditions(query, params):
+    """SQL conditions for a SearchIndex query, one per term (all must hold)
+
+    Same semantics as SearchIndex: a term matches any of SEARCH_FIELDS
+    unless scoped with "field:", case-insensitively as a substring or a
+    prefix.
+    """
+    expressions = {field: field for field in SEARCH_FIELDS}
+    expressions['vintage'] = VINTAGE_LABEL
+    conditions = []
+    for i, (field, term, prefix) in enumerate(SearchIndex.parse(query)):
+        params[f'search_{i}'] = _like_pattern(term, prefix)
+        matches = [
+            f"LOWER({expressions[name]}) LIKE :search_{i} ESCAPE '\\'"
+            for name in ([field] if field else SEARCH_FIELDS)
+        ]
+        conditions.append(f"({' OR '.join(matches)})")
+    return conditions
+
+
+def _cohorts(keys, granularity='quarter'):
+    """Ordered categorical of cohort labels for SQL cohort keys"""
+    freq, _ = COHORT_GRANULARITIES[granularity]
+    periods = pd.Categorical([pd.Period(key, freq) for key in keys])
+    labels = cohort_labels(periods.categories, granularity)
+    return pd.Categorical.from_codes(periods.codes,
+                                     categories=labels,
+                                     ordered=True)
+
+
+def _loan_rows(df):
+    """A prepared loan frame as plain values for the loans table"""
+    rows = pd.DataFrame({col: df[col] for col in LOAN_COLUMNS if col in df})
+    for col in ['platform', 'business_name', 'risk_category']:
+        if col in rows:
+            rows[col] = rows[col].astype(object)
+    rows['funded_date'] = df['funded_date'].dt.strftime('%Y-%m-%d %H:%M:%S.%f')
+    return rows
+
+
+def _read_chunks(file_path, chunksize):
+    reader = pd.read_csv(file_path, dtype=CSV_DTYPES, chunksize=chunksize)
+    for chunk in reader:
+        yield prepare_loan_data(chunk)
+
+
+@profiled(rows=lambda args, result: None)
+def populate_loan_db(db_path, file_path=DATA_FILE, df=None,
+                     chunksize=DEFAULT_CHUNKSIZE):
+    """Write the loan book into a fresh database file at db_path
+
+    Loans come from df when given, otherwise from file_path read in chunks,
+    so populating never holds more than one chunk. The file is built
+    beside db_path and swapped in whole; readers see the old or new book.
+    """
+    version = source_version(file_path)
+    frames = [df] if df is not None else _read_chunks(file_path, chunksize)
+    tmp_path = f"{db_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    with closing(sqlite3.connect(tmp_path)) as conn:
+        conn.execute(LOANS_TABLE)
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        for frame in frames:
+            _loan_rows(frame).to_sql('loans', conn, if_exists='append',
+                                     index=False, chunksize=chunksize)
+        conn.execute("CREATE INDEX loans_platform ON loans (platform)")
+        conn.executemany("INSERT INTO meta VALUES (?, ?)",
+                         [('source_version', version),
+                          ('schema_version', str(SQL_SCHEMA_VERSION))])
+        conn.commit()
+    os.replace(tmp_path, db_path)
+    return version
+
+
+class LoanDatabase:
+    """Loan book kept in an on-disk SQLite file and queried in place
+
+    Filters and group-bys run inside the database; only aggregated rows
+    come back into Python, so the loan book never has to fit in memory.
+    One instance is shared by every session; each query opens its own
+    connection.
+    """
+
+    def __init__(self, db_path, file_path=DATA_FILE):
+        self.db_path = db_path
+        self.file_path = file_path
+        self.version = None
+        self.loaded_at = None
+        self._lock = threading.Lock()
+
+    def stored_version(self):
+        """Source version the database file was built from, or None"""
+        try:
+            meta = dict(self.query("SELECT key, value FROM meta").values)
+        except (sqlite3.Error, pd.errors.DatabaseError):
+            return None
+        if meta.get('schema_version') != str(SQL_SCHEMA_VERSION):
+            return None
+        return meta.get('source_version')
+
+    def sync(self, df=None):
+        """Rebuild the database if the source file changed; returns version
+
+        df, when given, is the already-loaded book for the current source
+        and saves reading the file again.
+        """
+        with self._lock:
+            version = source_version(self.file_path)
+            if self.stored_version() != version:
+                populate_loan_db(self.db_path, self.file_path, df)
+            if version != self.version:
+                self.version = version
+                self.loaded_at = time.time()
+            return version
+
+    @property
+    def age_seconds(self):
+        return time.time() - self.loaded_at
+
+    def query(self, sql, params=None):
+        """Result of one SQL query as a DataFrame"""
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            # Not every SQLite build ships the math functions
+            conn.create_function('ln', 1, math.log, deterministic=True)
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def query_chunks(self, sql, params, chunksize):
+        """Result of one SQL query as DataFrames of up to chunksize rows
+
+        The connection stays open until the chunks are exhausted or the
+        generator is closed.
+        """
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            conn.create_function('ln', 1, math.log, deterministic=True)
+            yield from pd.read_sql_query(sql, conn, params=params,
+                                         chunksize=chunksize)
+
+    @property
+    def platforms(self):
+        """Platform names present in the data, sorted"""
+        result = self.query(
+            "SELECT DISTINCT platform FROM loans ORDER BY platform")
+        return result['platform'].tolist()
+
+    def select(self, platform):
+        """Query handle for one platform's loans ('All' for every loan)"""
+        return LoanQuery(self, platform)
+
+
+class LoanQuery:
+    """Loans of one platform in a LoanDatabase, answered by SQL
+
+    Accepted by get_vintage_data, get_risk_summary, calculate_risk_metrics
+    and analyze_repayment_velocity in place of a DataFrame; each runs one
+    grouped query filtered to the platform.
+    """
+
+    # Columns of the equivalent loaded frame
+    columns = LOAN_COLUMNS + ['vintage', 'risk_flags', 'loan_size_category']
+
+    def __init__(self, database, platform='All', search_term=None):
+        self.database = database
+        self.platform = platform
+        self.search_term = search_term
+
+    def _where(self, params):
+        conditions = []
+        if self.platform != 'All':
+            params['platform'] = self.platform
+            conditions.append("platform = :platform")
+        if self.search_term:
+            conditions += _search_conditions(self.search_term, params)
+        if not conditions:
+            return ""
+        return "WHERE " + " AND ".join(conditions)
+
+    def search(self, query):
+        """Handle for the loans matching a SearchIndex query, via LIKE"""
+        return LoanQuery(self.database, self.platform, query)
+
+    def _sort_key(self, column, params):
+        """SQL expression ordering rows like the loaded frame's column"""
+        if column == 'vintage':
+            return COHORT_KEYS['quarter']
+        if column == 'risk_flags':
+            return RISK_FLAGS_MASK
+        if column == 'loan_size_category':
+            clauses = []
+            for i, edge in enumerate(LOAN_SIZE_EDGES[:-1]):
+                params[f'sort_edge_{i}'] = edge
+                clauses.append(f"WHEN amount < :sort_edge_{i} THEN {i}")
+            return (f"CASE {' '.join(clauses)} "
+                    f"ELSE {len(LOAN_SIZE_EDGES) - 1} END")
+        return column
+
+    @profiled()
+    def page(self, columns, sort_column=None, descending=False, start=0,
+             stop=None):
+        """Rows start..stop of the loans under a sort, as a DataFrame
+
+        Sorting, paging and any search run in the database; only the page
+        comes back. Ties keep source order, reversed when descending, and
+        missing values sort last (first when descending) like the
+        in-memory grid.
+        """
+        params = {'limit': -1 if stop is None else stop - start,
+                  'offset': start}
+        order = "rowid"
+        if sort_column in self.columns:
+            key = self._sort_key(sort_column, params)
+            direction = "DESC" if descending else "ASC"
+            order = (f"({key}) IS NULL {direction}, {key} {direction}, "
+                     f"rowid {direction}")
+        df = self.database.query(
+            f"""
+            SELECT * FROM loans {self._where(params)}
+            ORDER BY {order} LIMIT :limit OFFSET :offset
+            """, params)
+        return self._prepared(df)[columns]
+
+    @staticmethod
+    def _prepared(df):
+        """Loans table rows as a prepared, compact DataFrame"""
+        df['funded_date'] = pd.to_datetime(df['funded_date'])
+        df['vintage'] = derive_cohorts(df['funded_date'])
+        df['risk_flags'] = encode_risk_flags(df)
+        return bucket_loan_sizes(compact_loan_data(df))
+
+    def _loans(self, params):
+        """Filtered loans with their repayment percentage, as a subquery"""
+        return (f"(SELECT *, {REPAYMENT_PCT} AS repayment_pct "
+                f"FROM loans {self._where(params)})")
+
+    def __len__(self):
+        params = {}
+        result = self.database.query(
+            f"SELECT COUNT(*) AS n FROM loans {self._where(params)}", params)
+        return int(result['n'].iloc[0])
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    @profiled()
+    def frame(self):
+        """The matching loans loaded as a prepared, compact DataFrame"""
+        params = {}
+        df = self.database.query(
+            f"SELECT * FROM loans {self._where(params)} ORDER BY rowid",
+            params)
+        return self._prepared(df)
+
+    def chunks(self, chunksize):
+        """The matching loans as prepared frames of up to chunksize rows
+
+        Same rows and order as frame(), from one query, with only one
+        chunk in memory at a time.
+        """
+        params = {}
+        for df in self.database.query_chunks(
+                f"SELECT * FROM loans {self._where(params)} ORDER BY rowid",
+                params, chunksize):
+            yield self._prepared(df)
+
+    @profiled()
+    def risk_cube(self):
+        """build_risk_cube of the platform's loans, grouped in the database"""
+        params = {}
+        flags = ", ".join(f"SUM({flag} = 1) AS {flag}" for flag in RISK_FLAGS)
+        cube = self.database.query(
+            f"""
+            SELECT platform, {COHORT_KEYS['quarter']} AS vintage,
+                   risk_category, {_size_case(params)} AS loan_size_category,
+                   COUNT(*) AS loan_count, SUM(amount) AS amount,
+                   SUM(repaid_amount) AS repaid_amount, SUM(fees) AS fees,
+                   SUM(repayment_pct) AS repayment_pct_sum,
+                   SUM(repayment_pct * repayment_pct) AS repayment_pct_sq_sum,
+                   {flags}
+            FROM {self._loans(params)}
+            GROUP BY 1, 2, 3, 4
+            """, params)
+        cube['platform'] = cube['platform'].astype('category')
+        cube['vintage'] = _cohorts(cube['vintage'])
+        cube['risk_category'] = cube['risk_category'].astype('category')
+        cube['loan_size_category'] = pd.Categorical(
+            cube['loan_size_category'],
+            categories=['Other'] + LOAN_SIZE_LABELS,
+            ordered=True)
+        cube = cube.sort_values(CUBE_DIMENSIONS, ignore_index=True)
+        return cube[CUBE_DIMENSIONS + CUBE_MEASURES]
+
+    @profiled()
+    def vintage_data(self, granularity='quarter'):
+        """get_vintage_data of the platform's loans"""
+        params = {}
+        counts = self.database.query(
+            f"""
+            SELECT {COHORT_KEYS[granularity]} AS cohort, risk_category,
+                   COUNT(*) AS loans, SUM(amount) AS amount,
+                   SUM(repaid_amount) AS repaid_amount
+            FROM loans {self._where(params)}
+            GROUP BY 1, 2
+            """, params)
+        if counts.empty:
+            return pd.DataFrame()
+        counts['vintage'] = _cohorts(counts['cohort'], granularity)
+
+        vintage_totals = counts.groupby('vintage', observed=True)[[
+            'amount', 'repaid_amount'
+        ]].sum()
+        risk_by_vintage = counts.pivot_table(index='vintage',
+                                             columns='risk_category',
+                                             values='loans',
+                                             aggfunc='sum',
+                                             fill_value=0,
+                                             observed=True)
+        risk_by_vintage = risk_by_vintage[sorted(risk_by_vintage.columns)]
+        return build_vintage_data(vintage_totals, risk_by_vintage)
+
+    @profiled()
+    def risk_summary(self):
+        """get_risk_summary of the platform's loans"""
+        params = {}
+        counts = self.database.query(
+            f"""
+            SELECT platform, risk_category, COUNT(*) AS loans
+            FROM loans {self._where(params)}
+            GROUP BY 1, 2
+            """, params)
+        if counts.empty:
+            return pd.DataFrame(columns=RISK_CATEGORIES)
+        risk_counts = counts.pivot(index='platform',
+                                   columns='risk_category',
+                                   values='loans').fillna(0).astype('int64')
+        risk_counts = risk_counts.sort_index()[sorted(risk_counts.columns)]
+        return build_risk_summary(risk_counts)
+
+    @profiled()
+    def risk_metrics(self):
+        """calculate_risk_metrics of the platform's loans"""
+        params = {}
+        flags = ", ".join(f"SUM({flag} = 1) AS {flag}" for flag in RISK_FLAGS)
+        totals = self.database.query(
+            f"""
+            SELECT SUM(risk_category != 'No Risk') AS total_at_risk, {flags}
+            FROM loans {self._where(params)}
+            """, params).iloc[0]
+        # SUM over no rows is NULL
+        totals = pd.to_numeric(totals).fillna(0)
+        return build_risk_metrics(totals['total_at_risk'], totals[RISK_FLAGS])
+
+    @profiled()
+    def repayment_stats(self):
+        """GroupedStats of repayment percentage per vintage
+
+        Values are binned in the database with the same bins as
+        GroupedStats.from_values, so only one row per (vintage, bin)
+        comes back.
+        """
+        low, high = SKETCH_RANGE
+        params = {
+            'low': low,
+            'high': high,
+            'width': SKETCH_BIN_WIDTH,
+            'linear_bins': GroupedStats.linear_bin_count(),
+            'log_growth': math.log(SKETCH_GROWTH),
+            'last_bin': GroupedStats.bin_count() - 1
+        }
+        bins = self.database.query(
+            f"""
+            SELECT {COHORT_KEYS['quarter']} AS cohort,
+                   CASE WHEN repayment_pct >= :high
+                        THEN MIN(:linear_bins + CAST(
+                                     ln(repayment_pct / :high) / :log_growth
+                                     AS INTEGER), :last_bin)
+                        ELSE MIN(MAX(CAST((repayment_pct - :low) / :width
+                                          AS INTEGER), 0), :linear_bins - 1)
+                   END AS bin,
+                   COUNT(*) AS n, SUM(repayment_pct) AS total,
+                   SUM(repayment_pct * repayment_pct) AS total_sq,
+                   MIN(repayment_pct) AS minimum, MAX(repayment_pct) AS maximum
+            FROM {self._loans(params)}
+            WHERE repayment_pct IS NOT NULL
+            GROUP BY 1, 2
+            """, params)
+        return GroupedStats.from_bins(_cohorts(bins['cohort']), bins['bin'],
+                                      bins['n'], bins['total'],
+                                      bins['total_sq'], bins['minimum'],
+                                      bins['maximum'])
@@ -0,0 +1,134 @@
+import pandas as pd
+
+from utils.aggregates import GroupedStats
+from utils.instrumentation import profiled
+
+from utils.data_generator import (DATA_FILE, CSV_DTYPES, prepare_loan_data,
+                                  build_vintage_data, cohort_periods,
+                                  cohort_labels)
+from utils.risk_analyzer import (RISK_FLAGS, build_risk_summary,
+                                 build_risk_metrics, risk_flag_counts,
+                                 flag_totals)
+
+DEFAULT_CHUNKSIZE = 250_000
+
+# Columns the aggregates need; business_name is never read in this mode
+STREAM_COLUMNS = [
+    col for col in CSV_DTYPES if col != 'SMB Name'
+]
+
+
+class LoanAggregates:
+    """Running totals folded from loan chunks
+
+    Holds only per-vintage and per-platform tables, so its size depends on
+    the number of vintages/platforms/risk categories rather than loans.
+    """
+
+    def __init__(self):
+        self.vintage_totals = None
+        self.risk_by_vintage = None
+        self.risk_by_platform = None
+        self.total_at_risk = 0
+        self.flag_counts = pd.Series(0, index=RISK_FLAGS, dtype='int64')
+        self.loan_count = 0
+        self.repayment_stats = None
+
+    @staticmethod
+    def _add(total, part):
+        if total is None:
+            return part
+        return total.add(part, fill_value=0)
+
+    def update(self, chunk):
+        """Fold one prepared chunk of loans into the running totals"""
+        if chunk.empty:
+            return
+        # Key vintages by quarter period: each chunk has its own vintage
+        # categories, while periods align and sort the same in every chunk
+        vintage = cohort_periods(chunk['funded_date']).rename('vintage')
+        self.vintage_totals = self._add(
+            self.vintage_totals,
+            chunk.groupby(vintage)[['amount', 'repaid_amount']].sum())
+        self.risk_by_vintage = self._add(
+            self.risk_by_vintage,
+            chunk.groupby([vintage, 'risk_category'],
+                          observed=True).size().unstack(fill_value=0))
+        self.risk_by_platform = self._add(
+            self.risk_by_platform,
+            chunk.groupby(['platform', 'risk_category'],
+                          observed=True).size().unstack(fill_value=0))
+        mask_counts = risk_flag_counts(chunk['risk_flags'])
+        self.total_at_risk += int(mask_counts[1:].sum())
+        self.flag_counts += flag_totals(mask_counts)
+        self.loan_count += len(chunk)
+        stats = GroupedStats.from_values(
+            vintage, chunk['repaid_amount'] / chunk['amount'] * 100)
+        self.repayment_stats = (stats if self.repayment_stats is None else
+                                self.repayment_stats.merge(stats))
+
+    def vintage_data(self):
+        """Same values as get_vintage_data on the full frame
+
+        amount is int64 here; the compact frame sums its int32 column.
+        """
+        if self.vintage_totals is None:
+            return pd.DataFrame()
+        vintage_totals = self._label_vintages(self.vintage_totals)
+        vintage_totals['amount'] = vintage_totals['amount'].astype('int64')
+        risk_by_vintage = self._label_vintages(
+            self.risk_by_vintage.fillna(0).astype('int64'))
+        risk_by_vintage = risk_by_vintage[sorted(risk_by_vintage.columns)]
+        risk_by_vintage.columns.name = 'risk_category'
+        return build_vintage_data(vintage_totals, risk_by_vintage)
+
+    @staticmethod
+    def _label_vintages(table):
+        table = table.sort_index()
+        labels = cohort_labels(table.index)
+        table.index = pd.CategoricalIndex(labels,
+                                          categories=labels,
+                                          ordered=True,
+                                          name='vintage')
+        return table
+
+    def repayment_percentiles(self, quantiles=(0.1, 0.5, 0.9)):
+        """Per-vintage percentiles of the loan-level repayment percentage"""
+        if self.repayment_stats is None:
+            return pd.DataFrame()
+        return self._label_vintages(
+            pd.DataFrame({q: self.repayment_stats.quantile(q)
+                          for q in quantiles}))
+
+    def risk_summary(self):
+        """Same output as get_risk_summary on the full frame"""
+        if self.risk_by_platform is None:
+            return build_risk_summary(pd.DataFrame())
+        risk_counts = self.risk_by_platform.fillna(0).astype('int64')
+        risk_counts = risk_counts.sort_index()[sorted(risk_counts.columns)]
+        # Platforms are categorical in the compact schema
+        risk_counts.index = pd.CategoricalIndex(risk_counts.index,
+                                                name='platform')
+        return build_risk_summary(risk_counts)
+
+    def risk_metrics(self):
+        """Same output as calculate_risk_metrics on the full frame"""
+        return build_risk_metrics(self.total_at_risk, self.flag_counts)
+
+
+@profiled(rows=lambda args, result: result.loan_count)
+def stream_loan_aggregates(file_path=DATA_FILE, chunksize=DEFAULT_CHUNKSIZE):
+    """Read the loan CSV in chunks and return the folded LoanAggregates
+
+    Each chunk is parsed with pinned dtypes, has risk_category and vintage
+    derived, is folded into the totals and then dropped, so peak memory is
+    bounded by chunksize regardless of file size.
+    """
+    aggregates = LoanAggregates()
+    reader = pd.read_csv(file_path,
+                         usecols=STREAM_COLUMNS,
+                         dtype=CSV_DTYPES,
+                         chunksize=chunksize)
+    for chunk in reader:
+        aggregates.update(prepare_loan_data(chunk))
+    return aggregates
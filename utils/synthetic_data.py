@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+# Distributions measured on attached_assets/pipe_final_data.csv (20k loans)
+PLATFORM_SHARES = {
+    'Housecall Pro': 0.47965,
+    'Priority': 0.40030,
+    'Boulevard': 0.12005,
+}
+
+# Risk flags are mutually exclusive in the source data
+RISK_FLAG_RATES = {
+    'Liquidity Risk': 0.14095,
+    'Revenue Drop Risk': 0.09945,
+    'Non-Payment Risk': 0.0617,
+}
+
+# Loan amounts: share of loans per size band, log-uniform within each band
+AMOUNT_BANDS = [
+    (0.1107, 6_485, 10_000),
+    (0.7711, 10_000, 50_000),
+    (0.0961, 50_000, 150_000),
+    (0.0221, 150_000, 194_332),
+]
+
+FEE_RATE_RANGE = (0.05, 0.12)
+
+FUNDED_START = pd.Timestamp('2024-03-01 17:39:40')
+FUNDED_DAYS = 334
+
+# Repaid share of the loan grows ~0.25% per day since funding, capped at 90%
+REPAID_PER_DAY = 0.0025
+REPAID_BASE_RANGE = (0.03, 0.12)
+REPAID_CAP = 0.9
+
+
+def generate_loan_book(n_loans, seed=0):
+    """Synthetic loans in the source CSV schema (same headers and dtypes)
+
+    The same seed always yields the same frame.
+    """
+    rng = np.random.default_rng(seed)
+
+    platforms = list(PLATFORM_SHARES)
+    platform = np.array(platforms, dtype=object)[rng.choice(
+        len(platforms), size=n_loans, p=list(PLATFORM_SHARES.values()))]
+
+    shares = np.array([band[0] for band in AMOUNT_BANDS])
+    band = rng.choice(len(AMOUNT_BANDS), size=n_loans, p=shares / shares.sum())
+    low = np.log([b[1] for b in AMOUNT_BANDS])[band]
+    high = np.log([b[2] for b in AMOUNT_BANDS])[band]
+    amount = np.exp(rng.uniform(low, high)).astype('int64')
+
+    fees = np.round(amount * rng.uniform(*FEE_RATE_RANGE, size=n_loans), 2)
+
+    offset_seconds = rng.uniform(0, FUNDED_DAYS * 86_400, size=n_loans)
+    funded = FUNDED_START + pd.to_timedelta(offset_seconds, unit='s')
+    age_days = FUNDED_DAYS - offset_seconds / 86_400
+    repaid_share = np.minimum(
+        age_days * REPAID_PER_DAY + rng.uniform(*REPAID_BASE_RANGE,
+                                                size=n_loans), REPAID_CAP)
+
+    # One draw picks at most one risk flag per loan
+    risk_draw = rng.uniform(size=n_loans)
+    edges = np.cumsum(list(RISK_FLAG_RATES.values()))
+    risk = np.searchsorted(edges, risk_draw, side='right')
+
+    names = pd.Series(rng.integers(1, max(10 * n_loans, 100_000),
+                                   size=n_loans)).astype(str)
+
+    book = pd.DataFrame({
+        'Embedded Platform Name': platform,
+        'SMB Name': 'SMB_' + names,
+        'Loan Funded On': funded,
+        'Loan Amount': amount,
+        'Pipe Fees': fees,
+        'Repaid Total So Far': amount * repaid_share,
+    })
+    for position, flag in enumerate(RISK_FLAG_RATES):
+        book[flag] = (risk == position).astype('int64')
+    return book
+
+
+def write_loan_book(path, n_loans, seed=0, chunk_rows=1_000_000):
+    """Write a synthetic loan book CSV of n_loans rows, chunk_rows at a time
+
+    Each chunk gets its own child seed so memory stays bounded by
+    chunk_rows and the output depends only on (n_loans, seed, chunk_rows).
+    """
+    chunk_count = max(1, -(-n_loans // chunk_rows))
+    seeds = np.random.SeedSequence(seed).spawn(chunk_count)
+    with open(path, 'w', newline='') as handle:
+        for index, child in enumerate(seeds):
+            rows = min(chunk_rows, n_loans - index * chunk_rows)
+            generate_loan_book(rows, seed=child).to_csv(handle,
+                                                        header=(index == 0),
+                                                        index=False)
+    return path
@@ -0,0 +1,75 @@
+import pandas as pd
+
+from utils.aggregates import GroupedStats
+from utils.instrumentation import profiled
+from utils.risk_cube import cube_repayment_velocity
+
+# Loans per slice when building the repayment-percentage sketch, so the
+# loan-level percentage column only ever exists one slice at a time
+STATS_CHUNK_ROWS = 500_000
+
+# Percentiles of the loan-level repayment percentage shown per vintage
+VELOCITY_QUANTILES = {'p10_repayment_pct': 0.1, 'p90_repayment_pct': 0.9}
+
+
+def repayment_stats(df, chunk_rows=STATS_CHUNK_ROWS):
+    """Mergeable per-vintage stats of the loan-level repayment percentage"""
+    stats = None
+    for start in range(0, max(len(df), 1), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        part = GroupedStats.from_values(
+            chunk['vintage'], chunk['repaid_amount'] / chunk['amount'] * 100)
+        stats = part if stats is None else stats.merge(part)
+    return stats
+
+
+@profiled()
+def analyze_repayment_velocity(df, cube=None):
+    """Analyze the repayment velocity across different vintages
+
+    Median and p10/p90 come from a mergeable quantile sketch of the
+    loan-level repayment percentage: within 0.01 points of exact for
+    percentages up to 200, and within 1% of the value above that (see
+    GroupedStats). With a risk cube, the remaining columns come from its
+    per-vintage sums.
+    df may also be a LoanQuery (utils/sql_backend.py); then the sketch and,
+    unless given, the cube are aggregated in SQL.
+    """
+    if not isinstance(df, pd.DataFrame):
+        stats = df.repayment_stats()
+        cube = df.risk_cube() if cube is None else cube
+        if cube.empty:
+            return pd.DataFrame()
+    elif df.empty or 'repaid_amount' not in df.columns or 'amount' not in df.columns:
+        return pd.DataFrame()
+    else:
+        stats = repayment_stats(df)
+
+    if cube is not None:
+        velocity_data = cube_repayment_velocity(cube, stats.quantile(0.5))
+    else:
+        sums = df.groupby('vintage', observed=True)[['amount',
+                                                     'repaid_amount']].sum()
+        velocity_data = pd.DataFrame({
+            'avg_repayment_pct': stats.mean(),
+            'median_repayment_pct': stats.quantile(0.5),
+            'std_repayment_pct': stats.std(),
+            'loan_count': pd.Series(stats.count, index=stats.keys),
+        }).reindex(sums.index)
+        velocity_data['total_amount'] = sums['amount']
+        velocity_data['total_repaid'] = sums['repaid_amount']
+
+        # Calculate overall repayment rate
+        velocity_data['overall_repayment_rate'] = velocity_data[
+            'total_repaid'] / velocity_data['total_amount'] * 100
+
+        # vintage is an ordered categorical, so the groupby above already
+        # returns vintages in chronological order
+        velocity_data = velocity_data.reset_index()
+
+    if velocity_data.empty:
+        return velocity_data
+    vintages = pd.Index(velocity_data['vintage'])
+    for column, q in VELOCITY_QUANTILES.items():
+        velocity_data[column] = stats.quantile(q).reindex(vintages).to_numpy()
+    return velocity_data